@@ -1,69 +1,359 @@
 # config.py
+import logging
 import os
+import sys
+import threading
+import time
+from collections import ChainMap
+from dataclasses import dataclass, field
+from functools import cache, lru_cache
 from pathlib import Path
+from typing import Callable, Mapping
 
-from dotenv import load_dotenv
 
+__all__ = ["BASE_DIR", "CONFIG", "Config", "Settings", "get_config"]
 
-BASE_DIR = Path(__file__).resolve().parents[2]
-# Load root .env first (if present) then client/.env so either can override
+logger = logging.getLogger(__name__)
+
+# Setting KUBOID_BASE_DIR skips the realpath walk and relocates the .env lookup;
+# it is only read here, never written back into the environment.
+BASE_DIR = Path(os.environ.get("KUBOID_BASE_DIR") or Path(__file__).resolve().parents[2])
+# Root .env takes precedence over client/.env; neither overrides values that are
+# already set, so the real environment always wins over the files.
 ROOT_ENV = BASE_DIR / ".env"
 ENV_PATH = BASE_DIR / "client" / ".env"
-if ROOT_ENV.exists():
-    load_dotenv(ROOT_ENV)
-if ENV_PATH.exists():
-    load_dotenv(ENV_PATH)
 
-class Config:
+
+def _parse_env_file(path: Path) -> dict[str, str]:
+    """Minimal KEY=VALUE parser for our small, trusted .env files
+
+    Handles comments, blank lines, an optional ``export`` prefix, matching single or
+    double quotes and trailing `` # comments`` on unquoted values. Variable expansion
+    and multi-line values are not supported.
+    """
+    values: dict[str, str] = {}
+    with open(os.fspath(path), "rb") as env_file:
+        for raw in env_file:
+            line = raw.strip()
+            if not line or line.startswith(b"#"):
+                continue
+            if line.startswith(b"export "):
+                line = line[7:].lstrip()
+            key, sep, value = line.partition(b"=")
+            key = key.strip()
+            if not sep or not key:
+                continue
+            value = value.strip()
+            if len(value) >= 2 and value[:1] in (b'"', b"'") and value[-1:] == value[:1]:
+                value = value[1:-1]
+            else:
+                value = value.split(b" #", 1)[0].rstrip()
+            # Keys decoded at runtime are not interned like the identifier literals we
+            # look them up with; interning lets lookups hit the identity fast path.
+            values[sys.intern(key.decode())] = value.decode()
+    return values
+
+
+def _find_env_files() -> list[Path]:
+    """Return the existing .env files, highest precedence first"""
+    # One directory scan answers both "is there a root .env" and "is there a client/
+    # dir" (entry types come from the scan itself); only client/.env needs its own stat.
+    try:
+        with os.scandir(BASE_DIR) as scan:
+            entries = {entry.name: entry for entry in scan}
+    except OSError:
+        return []
+
+    env_files = []
+    root_entry = entries.get(ROOT_ENV.name)
+    if root_entry is not None and root_entry.is_file():
+        env_files.append(ROOT_ENV)
+    client_entry = entries.get(ENV_PATH.parent.name)
+    if client_entry is not None and client_entry.is_dir() and ENV_PATH.is_file():
+        env_files.append(ENV_PATH)
+    return env_files
+
+
+def _read_env_files() -> dict[str, str]:
+    """Parse the .env files into a plain dict without writing them into os.environ"""
+    # Deployments that export their settings directly (SUPABASE_URL is always required)
+    # skip reading and parsing the .env files altogether.
+    if os.environ.get("SUPABASE_URL"):
+        return {}
+
+    values: dict[str, str] = {}
+    # Apply lowest precedence first so ROOT_ENV ends up winning
+    for env_file in reversed(_find_env_files()):
+        values.update(_parse_env_file(env_file))
+    return values
+
+
+def _int_setting(env: Mapping[str, str], name: str, default: int, minimum: int) -> int:
+    """Read an integer setting, rejecting non-numeric values and values below ``minimum``"""
+    raw = env.get(name)
+    try:
+        value = int(raw) if raw is not None else default
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got {raw!r}") from None
+    if value < minimum:
+        raise ValueError(f"{name} must be at least {minimum}, got {value}")
+    return value
+
+
+def _float_setting(env: Mapping[str, str], name: str, default: float, minimum: float) -> float:
+    """Read a numeric setting, rejecting non-numeric values and values below ``minimum``"""
+    raw = env.get(name)
+    try:
+        value = float(raw) if raw is not None else default
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got {raw!r}") from None
+    if not value >= minimum:
+        raise ValueError(f"{name} must be at least {minimum}, got {value}")
+    return value
+
+
+# Settings served through _SecretStore so they can be rotated without a restart
+_SECRET_NAMES: tuple[str, ...] = ("SUPABASE_SERVICE_ROLE_KEY", "OPENAI_API_KEY", "EMBED_SECRET")
+# Secret used in place of an unset one; applied on every refresh, so rotating the
+# fallback also rotates the secret that borrows it
+_SECRET_FALLBACKS: dict[str, str] = {"EMBED_SECRET": "SUPABASE_SERVICE_ROLE_KEY"}
+
+
+def _fetch_secret(name: str) -> str | None:
+    """Default secret source: the live environment, then the .env files on disk"""
+    value = os.environ.get(name)
+    if value:
+        return value
+    for env_file in _find_env_files():
+        value = _parse_env_file(env_file).get(name)
+        if value:
+            return value
+    return None
+
+
+class _SecretStore:
+    """Serves secrets from memory and refreshes them in the background once stale
+
+    Reads never block: an expired entry is still returned while a daemon thread fetches
+    the new value (stale-while-revalidate). A ``ttl`` of 0 disables refreshing.
+    """
+
+    def __init__(
+        self,
+        values: Mapping[str, str | None],
+        ttl: float = 0,
+        fetch: Callable[[str], str | None] = _fetch_secret,
+    ) -> None:
+        now = time.monotonic()
+        self._entries = {name: (value, now) for name, value in values.items()}
+        self._ttl = ttl
+        self._fetch = fetch
+        self._refreshing: set[str] = set()
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> str | None:
+        value, fetched_at = self._entries[name]
+        if self._ttl and time.monotonic() - fetched_at > self._ttl:
+            self._schedule_refresh(name)
+        return value
+
+    def put(self, name: str, value: str | None) -> None:
+        self._entries[name] = (value, time.monotonic())
+
+    def set_source(self, fetch: Callable[[str], str | None]) -> None:
+        """Swap the secret source, e.g. for a Vault or Secrets Manager lookup"""
+        self._fetch = fetch
+
+    def _schedule_refresh(self, name: str) -> None:
+        with self._lock:
+            if name in self._refreshing:
+                return
+            self._refreshing.add(name)
+        threading.Thread(
+            target=self._refresh, args=(name,), name=f"refresh-{name}", daemon=True
+        ).start()
+
+    def _refresh(self, name: str) -> None:
+        try:
+            value = self._fetch(name)
+            if not value and name in _SECRET_FALLBACKS:
+                value = self._fetch(_SECRET_FALLBACKS[name])
+        except Exception as exc:
+            logger.warning("Failed to refresh secret %s: %s", name, exc)
+            value = None
+        # Keep serving the last good value if the source came back empty; either way the
+        # TTL restarts so a failing source is not hammered on every read.
+        current = self._entries[name][0]
+        self._entries[name] = (value or current, time.monotonic())
+        with self._lock:
+            self._refreshing.discard(name)
+
+
+class _Secret:
+    """Settings attribute that reads through the instance's ``_SecretStore``"""
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+
+    def __get__(self, obj: "Settings | None", owner: type | None = None):
+        if obj is None:
+            return self
+        return obj._secrets.get(self.name)
+
+
+# Settings that validate() requires to be non-empty
+_REQUIRED_VARS: tuple[str, ...] = (
+    "SUPABASE_URL",
+    "SUPABASE_SERVICE_ROLE_KEY",
+    "OPENAI_API_KEY",
+    "CORS_ORIGINS",
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Process-wide settings, read from the environment once by ``get_config()``"""
+
     # Supabase
-    SUPABASE_URL = os.getenv("SUPABASE_URL")
-    SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-    
+    SUPABASE_URL: str | None
+    SUPABASE_SERVICE_ROLE_KEY = _Secret()
+
     # Qdrant
-    QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
-    QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-    
+    QDRANT_URL: str
+    QDRANT_API_KEY: str | None
+    # Talk to Qdrant over gRPC (protobuf, HTTP/2) instead of REST
+    QDRANT_PREFER_GRPC: bool
+    QDRANT_GRPC_PORT: int
+    # Points per upsert request, and upsert requests in flight at once
+    QDRANT_BATCH_SIZE: int
+    QDRANT_UPLOAD_CONCURRENCY: int
+
     # OpenAI
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    OPENAI_API_KEY = _Secret()
 
     # Widget
-    EMBED_SECRET = os.getenv("EMBED_SECRET")
+    EMBED_SECRET = _Secret()
 
     # Frontend
-    WIDGET_SCRIPT_BASE_URL = os.getenv("WIDGET_SCRIPT_BASE_URL", "http://localhost:8000")
+    WIDGET_SCRIPT_BASE_URL: str
+    FRONTEND_WIDGET_SCRIPT: str
     # CORS - comma separated list of allowed origins (no fallback)
-    CORS_ORIGINS = os.getenv("CORS_ORIGINS")
-    
-    # Processing
-    CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
-    CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
-    
+    CORS_ORIGINS: str | None
+    # CORS_ORIGINS split once at load, for O(1) origin membership checks
+    CORS_ORIGINS_SET: frozenset[str]
+
+    # Processing (chunk sizes are measured in embedding-model tokens)
+    CHUNK_SIZE: int
+    CHUNK_OVERLAP: int
+    # Max documents ingested concurrently by process_all_documents
+    INGEST_CONCURRENCY: int
+    # Chunk embeddings kept in the in-process cache (0 disables it)
+    EMBEDDING_CACHE_SIZE: int
+    # Texts per OpenAI embeddings request, and how many of those requests run at once
+    EMBED_BATCH_SIZE: int
+    EMBED_CONCURRENCY: int
+    # Vector size requested from text-embedding-3-large (at most 3072); must match the
+    # collection, so existing 3072-dim collections set EMBEDDING_DIMENSIONS=3072
+    EMBEDDING_DIMENSIONS: int
+
     # Collection name
-    COLLECTION_NAME = os.getenv("COLLECTION_NAME", "kuboid")
-    
-    @classmethod
-    def validate(cls):
+    COLLECTION_NAME: str
+
+    # Backing store for the _Secret attributes above (KUBOID_SECRET_TTL seconds, 0 = static)
+    _secrets: _SecretStore = field(repr=False, compare=False)
+
+    def validate(self):
         """Validate that required environment variables are set"""
-        required_vars = [
-            "SUPABASE_URL",
-            "SUPABASE_SERVICE_ROLE_KEY", 
-            "OPENAI_API_KEY",
-            "CORS_ORIGINS",
-        ]
-
-        if not cls.EMBED_SECRET:
-            logger_message = (
-                "Warning: EMBED_SECRET not set. Falling back to SUPABASE_SERVICE_ROLE_KEY for widget token signing."
-            )
-            print(logger_message)
-            cls.EMBED_SECRET = cls.SUPABASE_SERVICE_ROLE_KEY
-        
-        missing_vars = []
-        for var in required_vars:
-            if not getattr(cls, var):
-                missing_vars.append(var)
-        
-        if missing_vars:
-            raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
-        
-        return True
\ No newline at end of file
+        # The process-wide settings take the cached path; other instances are checked
+        # directly rather than being hashed as cache keys
+        if self is CONFIG:
+            return _validate_once()
+        return _check_required(self)
+
+    def invalidate(self):
+        """Force the next ``validate()`` call to re-run its checks"""
+        _validate_once.cache_clear()
+
+
+@cache
+def _validate_once() -> bool:
+    """Check CONFIG's required settings; a passing result is cached, a failure is not"""
+    return _check_required(CONFIG)
+
+
+def _check_required(settings: Settings) -> bool:
+    _getattr = getattr
+    missing_vars = tuple(var for var in _REQUIRED_VARS if not _getattr(settings, var))
+
+    if missing_vars:
+        raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
+
+    return True
+
+
+def _build(env: Mapping[str, str]) -> Settings:
+    """Build Settings from a mapping of raw setting values in a single call"""
+    cors_origins = env.get("CORS_ORIGINS")
+
+    # Checked once here so the text splitter can rely on sane chunking parameters
+    chunk_size = _int_setting(env, "CHUNK_SIZE", 256, minimum=1)
+    chunk_overlap = _int_setting(env, "CHUNK_OVERLAP", 50, minimum=0)
+    if chunk_overlap >= chunk_size:
+        raise ValueError(
+            f"CHUNK_OVERLAP ({chunk_overlap}) must be smaller than CHUNK_SIZE ({chunk_size})"
+        )
+
+    embedding_dimensions = _int_setting(env, "EMBEDDING_DIMENSIONS", 1024, minimum=1)
+    if embedding_dimensions > 3072:
+        raise ValueError(f"EMBEDDING_DIMENSIONS must be at most 3072, got {embedding_dimensions}")
+
+    secrets = {name: env.get(name) for name in _SECRET_NAMES}
+    for name, fallback in _SECRET_FALLBACKS.items():
+        if not secrets[name]:
+            logger.warning(f"{name} not set. Falling back to {fallback}.")
+            secrets[name] = secrets[fallback]
+
+    return Settings(
+        SUPABASE_URL=env.get("SUPABASE_URL"),
+        QDRANT_URL=env.get("QDRANT_URL", "http://localhost:6333"),
+        QDRANT_API_KEY=env.get("QDRANT_API_KEY"),
+        QDRANT_PREFER_GRPC=env.get("QDRANT_PREFER_GRPC", "true").strip().lower() in ("1", "true", "yes"),
+        QDRANT_GRPC_PORT=_int_setting(env, "QDRANT_GRPC_PORT", 6334, minimum=1),
+        QDRANT_BATCH_SIZE=_int_setting(env, "QDRANT_BATCH_SIZE", 64, minimum=1),
+        QDRANT_UPLOAD_CONCURRENCY=_int_setting(env, "QDRANT_UPLOAD_CONCURRENCY", 4, minimum=1),
+        WIDGET_SCRIPT_BASE_URL=env.get("WIDGET_SCRIPT_BASE_URL", "http://localhost:8000"),
+        FRONTEND_WIDGET_SCRIPT=env.get("FRONTEND_WIDGET_SCRIPT", "/widget.js"),
+        CORS_ORIGINS=cors_origins,
+        CORS_ORIGINS_SET=frozenset(
+            origin.strip() for origin in (cors_origins or "").split(",") if origin.strip()
+        ),
+        CHUNK_SIZE=chunk_size,
+        CHUNK_OVERLAP=chunk_overlap,
+        INGEST_CONCURRENCY=_int_setting(env, "INGEST_CONCURRENCY", 8, minimum=1),
+        EMBEDDING_CACHE_SIZE=_int_setting(env, "EMBEDDING_CACHE_SIZE", 2048, minimum=0),
+        EMBED_BATCH_SIZE=_int_setting(env, "EMBED_BATCH_SIZE", 256, minimum=1),
+        EMBED_CONCURRENCY=_int_setting(env, "EMBED_CONCURRENCY", 8, minimum=1),
+        EMBEDDING_DIMENSIONS=embedding_dimensions,
+        COLLECTION_NAME=env.get("COLLECTION_NAME", "kuboid"),
+        _secrets=_SecretStore(secrets, ttl=_float_setting(env, "KUBOID_SECRET_TTL", 0, minimum=0)),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_config() -> Settings:
+    """Build the settings singleton from the environment (first call only)"""
+    # One bulk copy of os.environ instead of a decode-per-key os.getenv for every field,
+    # layered over the parsed .env values. Both are temporaries, so they are released as
+    # soon as the settings are built.
+    return _build(ChainMap(os.environ.copy(), _read_env_files()))
+
+
+CONFIG = get_config()
+# Backwards-compatible name: existing call sites keep using ``Config.SUPABASE_URL``,
+# which is now a slot read on the bound instance rather than a class dict lookup.
+Config = CONFIG
+
+# Fail fast at startup rather than on the first request. Scripts and tests that import
+# config without the full environment can opt out with KUBOID_VALIDATE_ON_IMPORT=0.
+if os.environ.get("KUBOID_VALIDATE_ON_IMPORT", "1") == "1":
+    CONFIG.validate()
@@ -2,35 +2,63 @@ import os
 import io
 import sys
 import logging
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, AsyncIterator
 from pathlib import Path
 import asyncio
+import gzip
+import hashlib
+import json
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from array import array
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
 from urllib.parse import urlparse
 from uuid import uuid4
 
-# Document processing
-import PyPDF2
-from docx import Document
-import openpyxl
-from pptx import Presentation
-import pandas as pd
-import trafilatura
+# Document parsers (PyPDF2, PyMuPDF, python-docx, openpyxl, trafilatura) are imported
+# inside the extractors that use them, so workers only load the ones they need
+import httpx
+import tiktoken
+
+try:
+    # orjson encodes several times faster than the stdlib json module
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
 
 # LangChain imports
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
+from openai import AsyncOpenAI
 from langchain_core.documents import Document as LangChainDocument
 
 # Qdrant imports
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    Batch,
+    Distance,
+    FieldCondition,
+    Filter,
+    MatchAny,
+    OptimizersConfigDiff,
+    PayloadSchemaType,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams,
+)
 
 # Supabase imports
-from supabase import create_client, Client
+from supabase import AsyncClient
 
 # FastAPI imports
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Header
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Header
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 if str(BASE_DIR) not in sys.path:
@@ -43,58 +71,366 @@ except ImportError as analytics_import_error:
     analytics_router = None
 
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
-# Import config (try relative/package/absolute imports to be robust whether run as module or script)
-try:
-    # Preferred: relative import when running as a package (uvicorn backend.RAG.docs:app)
-    from .config import Config
-except Exception:
-    try:
-        # Try package-style import
-        from RAG.config import Config
-    except Exception:
-        # Fallback: add current directory to sys.path and import by module name
-        current_dir = Path(__file__).resolve().parent
-        if str(current_dir) not in sys.path:
-            sys.path.insert(0, str(current_dir))
-        from config import Config
+# Always import config through the single ``RAG.config`` module name (BASE_DIR is on
+# sys.path above). Importing it as ``.config`` or ``config`` as well would execute the
+# module a second time under another name, re-reading the .env files and leaving two
+# distinct ``Config`` objects resident (core.supabase and analytics use ``RAG.config``).
+from RAG.config import Config
+from RAG import pdf_pages
+from core.supabase import close_async_supabase_client, get_async_supabase_client
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-# Initialize clients using config
-supabase: Client = create_client(Config.SUPABASE_URL, Config.SUPABASE_SERVICE_ROLE_KEY)
+# Initialize clients using config. Supabase uses the native asyncio client, created on
+# startup (init_supabase) since it can only be built inside the event loop; the storage
+# bucket handle is stateless, so one instance serves every request. Both names stay
+# unbound until that hook has run: importing this module outside the app lifecycle
+# (scripts, REPL) must call ``await init_supabase()`` before touching Supabase.
+supabase: AsyncClient
+docs_bucket: Any
 # Initialize Qdrant client with optional API key (for Qdrant Cloud or secured instances)
 try:
-    qdrant_client = QdrantClient(url=Config.QDRANT_URL, api_key=getattr(Config, "QDRANT_API_KEY", None))
+    # Async client over gRPC: protobuf instead of JSON bodies, one multiplexed HTTP/2
+    # connection, and no blocking of the event loop on upserts/searches
+    qdrant_client = AsyncQdrantClient(
+        url=Config.QDRANT_URL,
+        api_key=Config.QDRANT_API_KEY,
+        prefer_grpc=Config.QDRANT_PREFER_GRPC,
+        grpc_port=Config.QDRANT_GRPC_PORT,
+        timeout=60,
+    )
 except Exception:
     # Fallback to basic initialization if something unexpected happens
-    qdrant_client = QdrantClient(url=Config.QDRANT_URL)
+    qdrant_client = AsyncQdrantClient(url=Config.QDRANT_URL)
+# Upserts in flight at once, across all documents (Qdrant throughput peaks at a few)
+qdrant_upload_semaphore = asyncio.Semaphore(Config.QDRANT_UPLOAD_CONCURRENCY)
+
+EMBEDDING_MODEL = "text-embedding-3-large"
+# text-embedding-3 models support shortened (Matryoshka) embeddings; the default 1024 of
+# the large model's 3072 dimensions keep nearly all of its retrieval quality at a third
+# of the size. Changing this requires recreating the collection and re-ingesting.
+EMBEDDING_DIMENSIONS = Config.EMBEDDING_DIMENSIONS
+
 embeddings = OpenAIEmbeddings(
-    openai_api_key=Config.OPENAI_API_KEY, model="text-embedding-3-large"
+    openai_api_key=Config.OPENAI_API_KEY,
+    model=EMBEDDING_MODEL,
+    dimensions=EMBEDDING_DIMENSIONS,
+    # OpenAI accepts up to 2048 inputs per request; langchain defaults to 1000 and sends
+    # the remainder as a second, sequential request
+    chunk_size=2048,
+    # Documents are ingested concurrently; back off and retry on 429s instead of failing
+    max_retries=6,
+    request_timeout=30,
+)
+
+# One client for all chat completions so its connection pool stays warm between turns
+openai_client = AsyncOpenAI(
+    api_key=Config.OPENAI_API_KEY,
+    max_retries=3,
+    timeout=httpx.Timeout(30.0, connect=5.0),
 )
 
 # Collection name for Qdrant
 COLLECTION_NAME = Config.COLLECTION_NAME
 URL_ACTIVITY_TABLE = "url_ingestion_activity"
+# Columns the dashboard renders for each URL activity
+URL_ACTIVITY_COLUMNS = "id,url,status,chunks_created,error,started_at,completed_at"
+# Batches with at least this many new documents pause vector indexing while uploading
+BULK_INGEST_MIN_DOCUMENTS = 20
+# OpenAI Batch API limits: inputs per embeddings request and per batch job
+BATCH_REQUEST_INPUTS = 2048
+BATCH_MAX_INPUTS = 50_000
+BATCH_POLL_SECONDS = 60
+BATCH_FINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+# Storage webhook uploads are ingested by a fixed pool of workers from a bounded queue
+WEBHOOK_INGEST_WORKERS = 4
+WEBHOOK_QUEUE_SIZE = 1024
+# Redelivered storage INSERT events within this window are acknowledged but not re-ingested
+WEBHOOK_DEDUPE_SECONDS = 300
+# Qdrant's default indexing_threshold (KB), restored if the current value can't be read
+DEFAULT_INDEXING_THRESHOLD = 20000
+NO_CONTEXT_ANSWER = "I couldn't find relevant information in the knowledge base."
+# ef=64 is plenty of HNSW candidates for the small top_k used by chat
+SEARCH_PARAMS = SearchParams(
+    hnsw_ef=64,
+    quantization=QuantizationSearchParams(rescore=True, oversampling=2.0),
+)
+
+WIDGET_SCRIPT_BASE_URL = Config.WIDGET_SCRIPT_BASE_URL
+FRONTEND_WIDGET_SCRIPT = Config.FRONTEND_WIDGET_SCRIPT
+
+
+# Set once the collection and its indexes are known to exist; later calls return at once
+_collection_ready = False
+_collection_lock = asyncio.Lock()
+
+
+def document_id_for_path(file_path: str) -> str:
+    """Qdrant document_id for a storage path (the single place this encoding is defined)"""
+    return file_path.replace("/", "_").replace("-", "_")
+
+
+async def ensure_collection() -> None:
+    """Create the Qdrant collection and its payload indexes if missing
+
+    Runs its Qdrant checks once per process (normally from the startup hook); every
+    later call is a flag check, so writers can call it unconditionally.
+    """
+    global _collection_ready
+    if _collection_ready:
+        return
+    async with _collection_lock:
+        if not _collection_ready:
+            await _create_collection_if_missing()
+            _collection_ready = True
+
+
+async def _create_collection_if_missing() -> None:
+    if not await qdrant_client.collection_exists(COLLECTION_NAME):
+        logger.info(f"Creating Qdrant collection {COLLECTION_NAME}")
+        await qdrant_client.create_collection(
+            collection_name=COLLECTION_NAME,
+            # int8 copies of the vectors stay in RAM (4x smaller than float32); originals and
+            # payloads live on disk and are only touched to rescore the final candidates
+            vectors_config=VectorParams(
+                size=EMBEDDING_DIMENSIONS, distance=Distance.COSINE, on_disk=True
+            ),
+            quantization_config=ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+            ),
+            on_disk_payload=True,
+        )
+    else:
+        info = await qdrant_client.get_collection(COLLECTION_NAME)
+        vector_size = getattr(info.config.params.vectors, "size", None)
+        if vector_size is not None and vector_size != EMBEDDING_DIMENSIONS:
+            # Every upsert and search would fail on the size mismatch, so refuse to start
+            raise RuntimeError(
+                f"Collection {COLLECTION_NAME} stores {vector_size}-dim vectors but embeddings "
+                f"are {EMBEDDING_DIMENSIONS}-dim; set EMBEDDING_DIMENSIONS={vector_size} or "
+                f"recreate the collection and re-ingest documents"
+            )
+
+    # Keyword index so document_id filters are index lookups, not full payload scans.
+    # Creating an index that already exists is a no-op.
+    await qdrant_client.create_payload_index(
+        collection_name=COLLECTION_NAME,
+        field_name="document_id",
+        field_schema=PayloadSchemaType.KEYWORD,
+    )
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent embedding requests into shared OpenAI calls
+
+    Documents ingested concurrently each ask for their chunk embeddings; instead of one
+    HTTP round-trip per document, requests arriving within ``max_wait`` seconds (or until
+    ``max_batch`` texts are queued) are sent together and the vectors scattered back.
+    Flushed batches are cut into ``max_batch``-sized requests that run concurrently, at
+    most ``concurrency`` at a time.
+    """
+
+    def __init__(
+        self,
+        embedder: OpenAIEmbeddings,
+        max_batch: int = 256,
+        max_wait: float = 0.05,
+        concurrency: int = 8,
+    ):
+        self._embedder = embedder
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._pending: List[Tuple[List[str], asyncio.Future]] = []
+        self._pending_texts = 0
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((texts, future))
+        self._pending_texts += len(texts)
+
+        if self._pending_texts >= self._max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self._max_wait, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        self._pending_texts = 0
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            # Hold a reference until the task is done so it isn't garbage collected
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[List[str], asyncio.Future]]) -> None:
+        texts = [text for request_texts, _ in batch for text in request_texts]
+        # Group similar-length texts so each request carries an even share of tokens
+        # and no slice waits on a few outsized chunks
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        sorted_texts = [texts[i] for i in order]
+        try:
+            # A single large document can exceed max_batch on its own; langchain would send
+            # its sub-batches one after another, so split and send them in parallel instead
+            slices = await asyncio.gather(
+                *(
+                    self._embed_slice(sorted_texts[start : start + self._max_batch])
+                    for start in range(0, len(sorted_texts), self._max_batch)
+                )
+            )
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        vectors: List[List[float]] = [None] * len(texts)  # type: ignore[list-item]
+        sorted_vectors = (vector for vectors_slice in slices for vector in vectors_slice)
+        for index, vector in zip(order, sorted_vectors):
+            vectors[index] = vector
+
+        offset = 0
+        for request_texts, future in batch:
+            end = offset + len(request_texts)
+            if not future.done():
+                future.set_result(vectors[offset:end])
+            offset = end
+
+    async def _embed_slice(self, texts: List[str]) -> List[List[float]]:
+        async with self._semaphore:
+            return await self._embedder.aembed_documents(texts)
+
+
+class EmbeddingCache:
+    """In-process LRU of chunk embeddings keyed by a hash of the chunk text
+
+    Re-ingesting a document (force_reprocess, a re-uploaded file, a re-scraped URL) or
+    chunks repeated across documents then skip the OpenAI call. Vectors are kept as
+    float32 arrays (4 bytes per dimension, about 4 KB at the default 1024 dimensions)
+    rather than lists of Python floats.
+    """
+
+    def __init__(self, max_entries: int):
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[bytes, array]" = OrderedDict()
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def get(self, key: bytes) -> List[float] | None:
+        vector = self._entries.get(key)
+        if vector is None:
+            return None
+        self._entries.move_to_end(key)
+        return vector.tolist()
+
+    def put(self, key: bytes, vector: List[float]) -> None:
+        if self._max_entries <= 0:
+            return
+        self._entries[key] = array("f", vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+
+class UrlTextCache:
+    """Remembers recently extracted page text so re-ingesting a URL skips the fetch"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 256):
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def get(self, url: str) -> str | None:
+        entry = self._entries.get(url)
+        if entry is None:
+            return None
+        expires_at, text = entry
+        if expires_at < time.monotonic():
+            del self._entries[url]
+            return None
+        return text
+
+    def put(self, url: str, text: str) -> None:
+        self._entries[url] = (time.monotonic() + self._ttl, text)
+        self._entries.move_to_end(url)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
 
-WIDGET_SCRIPT_BASE_URL = os.getenv("WIDGET_SCRIPT_BASE_URL", "http://localhost:8000")
-FRONTEND_WIDGET_SCRIPT = os.getenv("FRONTEND_WIDGET_SCRIPT", "/widget.js")
+# Shared pooled client for page fetches (keep-alive, HTTP/2 where the server offers it)
+http_client = httpx.AsyncClient(
+    http2=True,
+    timeout=30,
+    follow_redirects=True,
+    limits=httpx.Limits(max_connections=64),
+)
+url_text_cache = UrlTextCache(ttl_seconds=3600)
+
+# Long PDFs are extracted in page ranges across worker processes; shorter ones are not
+# worth the cost of shipping the file to the workers
+PDF_PARALLEL_MIN_PAGES = 16
+PDF_WORKERS = os.cpu_count() or 1
+_pdf_pool: ProcessPoolExecutor | None = None
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    if _pdf_pool is None:
+        # forkserver: workers start from a clean server process preloaded with RAG.pdf_pages
+        # only (the default would preload __main__). Under the uvicorn CLI that keeps this
+        # module, its clients and event loop state out of the workers; when started via
+        # `python docs.py`, multiprocessing still re-imports this file in each worker as
+        # __mp_main__ (the __main__ guard keeps the server from starting there).
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["RAG.pdf_pages"])
+        _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=context)
+    return _pdf_pool
+
+
+def _discard_pdf_pool(pool: ProcessPoolExecutor) -> None:
+    """Forget a broken pool, unless another caller already replaced it"""
+    global _pdf_pool
+    if _pdf_pool is pool:
+        _pdf_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Tokenizer of the text-embedding-3 models; built once and shared by every processor
+token_encoder = tiktoken.get_encoding("cl100k_base")
+
+embedding_batcher = EmbeddingBatcher(
+    embeddings, max_batch=Config.EMBED_BATCH_SIZE, concurrency=Config.EMBED_CONCURRENCY
+)
+embedding_cache = EmbeddingCache(Config.EMBEDDING_CACHE_SIZE)
 
 
 class DocumentProcessor:
     """Handles document processing pipeline"""
 
     def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=Config.CHUNK_SIZE,
-            chunk_overlap=Config.CHUNK_OVERLAP,
-            length_function=len,
-        )
+        # Chunk sizes are in tokens; Config guarantees 0 <= overlap < size
+        self.chunk_size = Config.CHUNK_SIZE
+        self.chunk_overlap = Config.CHUNK_OVERLAP
 
     def extract_text_from_file(self, file_content: bytes, file_name: str) -> str:
         """Extract text from various file formats"""
@@ -119,49 +455,124 @@ class DocumentProcessor:
 
     def _extract_from_pdf(self, file_content: bytes) -> str:
         """Extract text from PDF"""
+        try:
+            # PyMuPDF: native (MuPDF) text extraction, much faster than pure-Python PyPDF2
+            import pymupdf
+        except ImportError:
+            pymupdf = None  # type: ignore
+
+        if pymupdf is not None:
+            try:
+                with pymupdf.open(stream=file_content, filetype="pdf") as pdf:
+                    page_count = pdf.page_count
+                    if page_count < PDF_PARALLEL_MIN_PAGES or PDF_WORKERS < 2:
+                        return "\n".join(page.get_text("text") for page in pdf)
+                return self._extract_pdf_in_parallel(file_content, page_count)
+            except Exception as e:
+                # Font-encoding and damaged-xref edge cases: retry with PyPDF2 below
+                logger.warning(f"PyMuPDF failed to extract PDF, falling back to PyPDF2: {e}")
+
+        import PyPDF2
+
         pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text
+        # extract_text() can come back empty-handed (None) on image-only pages
+        return "\n".join(page.extract_text() or "" for page in pdf_reader.pages)
+
+    def _extract_pdf_in_parallel(self, file_content: bytes, page_count: int) -> str:
+        """Split a long PDF into one page range per worker process and join the results"""
+        step = -(-page_count // PDF_WORKERS)
+        pool = _get_pdf_pool()
+        try:
+            futures = [
+                pool.submit(
+                    pdf_pages.extract_page_range, file_content, start, min(start + step, page_count)
+                )
+                for start in range(0, page_count, step)
+            ]
+            return "\n".join(future.result() for future in futures)
+        except BrokenProcessPool as e:
+            # A worker died (e.g. MuPDF crashing on a malformed file); the executor is
+            # unusable from now on, so drop it and let the next long PDF start a fresh one
+            logger.warning(f"PDF worker pool broke, extracting serially: {e}")
+            _discard_pdf_pool(pool)
+            return pdf_pages.extract_page_range(file_content, 0, page_count)
+        except Exception as e:
+            # A broken or unavailable pool should cost speed, not the document
+            logger.warning(f"Parallel PDF extraction failed, extracting serially: {e}")
+            return pdf_pages.extract_page_range(file_content, 0, page_count)
 
     def _extract_from_docx(self, file_content: bytes) -> str:
         """Extract text from DOCX"""
+        from docx import Document
+
         doc = Document(io.BytesIO(file_content))
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text
+        return "\n".join(paragraph.text for paragraph in doc.paragraphs)
 
     def _extract_from_xlsx(self, file_content: bytes) -> str:
         """Extract text from XLSX"""
-        workbook = openpyxl.load_workbook(io.BytesIO(file_content))
-        text = ""
-        for sheet_name in workbook.sheetnames:
-            sheet = workbook[sheet_name]
-            for row in sheet.iter_rows(values_only=True):
-                text += " ".join(str(cell) for cell in row if cell) + "\n"
-        return text
+        import openpyxl
 
-    def _extract_from_url(self, url: str) -> str:
+        # read_only streams rows instead of building every cell object up front;
+        # data_only returns cached formula results rather than formula strings
+        workbook = openpyxl.load_workbook(
+            io.BytesIO(file_content), read_only=True, data_only=True
+        )
+        try:
+            # Rows stream straight into a single join; no intermediate list of row strings
+            return "\n".join(
+                " ".join(str(cell) for cell in row if cell)
+                for sheet in workbook.worksheets
+                for row in sheet.iter_rows(values_only=True)
+            )
+        finally:
+            # Read-only workbooks keep the archive open until closed
+            workbook.close()
+
+    async def _extract_from_url(self, url: str) -> str:
         """Extract text from URL"""
-        downloaded = trafilatura.fetch_url(url)
-        extracted_text = trafilatura.extract(downloaded)
+        cached = url_text_cache.get(url)
+        if cached is not None:
+            return cached
+
+        import trafilatura
+
+        response = await http_client.get(url)
+        response.raise_for_status()
+        # HTML parsing is CPU-bound; keep it off the event loop. fast=True skips the
+        # readability/justext fallback passes, which re-parse the page when the main
+        # extractor finds little text.
+        extracted_text = await asyncio.to_thread(trafilatura.extract, response.text, fast=True)
+        if extracted_text:
+            url_text_cache.put(url, extracted_text)
         return extracted_text
 
     def chunk_text(
         self, text: str, metadata: Dict[str, Any]
     ) -> List[LangChainDocument]:
-        """Split text into chunks"""
+        """Split text into overlapping windows of chunk_size tokens
+
+        Every chunk shares one metadata dict (a copy of ``metadata`` plus ``chunk_count``);
+        treat it as read-only.
+        """
         if not text.strip():
             return []
 
-        # Create LangChain document
-        doc = LangChainDocument(page_content=text, metadata=metadata)
-
-        # Split into chunks
-        chunks = self.text_splitter.split_documents([doc])
-        return chunks
+        # Tokenize once, then slice fixed windows: sized for the embedding model and no
+        # repeated separator scans over the text
+        tokens = token_encoder.encode(text, disallowed_special=())
+        size = self.chunk_size
+        step = size - self.chunk_overlap
+        # Stop before a final window that would only repeat the previous overlap
+        starts = range(0, max(len(tokens) - self.chunk_overlap, 1), step)
+
+        chunk_metadata = {**metadata, "chunk_count": len(starts)}
+        return [
+            LangChainDocument(
+                page_content=token_encoder.decode(tokens[start : start + size]),
+                metadata=chunk_metadata,
+            )
+            for start in starts
+        ]
 
     async def generate_embeddings(
         self, chunks: List[LangChainDocument]
@@ -171,7 +582,26 @@ class DocumentProcessor:
             return []
 
         texts = [chunk.page_content for chunk in chunks]
-        embeddings_list = await embeddings.aembed_documents(texts)
+        keys = [embedding_cache.key(text) for text in texts]
+        embeddings_list = [embedding_cache.get(key) for key in keys]
+
+        # Embed each distinct uncached text once
+        missing: Dict[bytes, str] = {}
+        for key, text, vector in zip(keys, texts, embeddings_list):
+            if vector is None:
+                missing.setdefault(key, text)
+
+        if missing:
+            # Shares OpenAI requests with any other documents being embedded right now
+            fresh = await embedding_batcher.embed(list(missing.values()))
+            fresh_by_key = dict(zip(missing.keys(), fresh))
+            for key, vector in fresh_by_key.items():
+                embedding_cache.put(key, vector)
+            embeddings_list = [
+                vector if vector is not None else fresh_by_key[key]
+                for key, vector in zip(keys, embeddings_list)
+            ]
+
         return embeddings_list
 
     async def store_in_qdrant(
@@ -179,46 +609,58 @@ class DocumentProcessor:
         chunks: List[LangChainDocument],
         embeddings_list: List[List[float]],
         document_id: str,
+        wait: bool = False,
     ):
-        """Store chunks and embeddings in Qdrant"""
+        """Store chunks and embeddings in Qdrant
+
+        With ``wait=False`` (bulk paths) upserts return once Qdrant has queued them; pass
+        ``wait=True`` when the result is reported to a user, so a write that fails while
+        being applied surfaces as an error instead of a success.
+        """
         if not chunks or not embeddings_list:
             return
 
-        # Ensure collection exists
-        try:
-            qdrant_client.get_collection(COLLECTION_NAME)
-        except:
-            qdrant_client.create_collection(
-                collection_name=COLLECTION_NAME,
-                vectors_config=VectorParams(size=1536, distance=Distance.COSINE),
-            )
+        await ensure_collection()
 
-        # Generate valid UUIDs for point IDs
-        import uuid
-
-        # Prepare points for Qdrant
-        points = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings_list)):
-            # Generate a valid UUID for each point
-            point_id = str(uuid.uuid4())
-
-            point = PointStruct(
-                id=point_id,
-                vector=embedding,
-                payload={
-                    "text": chunk.page_content,
-                    "metadata": chunk.metadata,
-                    "document_id": document_id,
-                    "chunk_index": i,
-                    "created_at": datetime.now().isoformat(),
-                },
-            )
-            points.append(point)
+        # Loop invariant: one UTC timestamp for the whole upload, not one clock read per point
+        created_at = datetime.now(timezone.utc).isoformat()
 
-        # Insert points into Qdrant
-        qdrant_client.upsert(collection_name=COLLECTION_NAME, points=points)
+        # Build ids, vectors and payloads as parallel columns (a Qdrant Batch) rather than
+        # one PointStruct object per chunk
+        ids = [str(uuid4()) for _ in chunks]
+        payloads = [
+            {
+                "text": chunk.page_content,
+                "metadata": chunk.metadata,
+                "document_id": document_id,
+                "chunk_index": i,
+                "created_at": created_at,
+            }
+            for i, chunk in enumerate(chunks)
+        ]
 
-        logger.info(f"Stored {len(points)} chunks for document {document_id}")
+        async def _upsert(start: int) -> None:
+            end = start + Config.QDRANT_BATCH_SIZE
+            async with qdrant_upload_semaphore:
+                # wait=False lets indexing overlap with the next upload instead of
+                # blocking on it
+                await qdrant_client.upsert(
+                    collection_name=COLLECTION_NAME,
+                    points=Batch(
+                        ids=ids[start:end],
+                        vectors=embeddings_list[start:end],
+                        payloads=payloads[start:end],
+                    ),
+                    wait=wait,
+                )
+
+        # Small requests stay under Qdrant's request size limit and pipeline well; the
+        # shared semaphore caps in-flight upserts across all documents being ingested
+        await asyncio.gather(
+            *(_upsert(start) for start in range(0, len(ids), Config.QDRANT_BATCH_SIZE))
+        )
+
+        logger.info(f"Stored {len(ids)} chunks for document {document_id}")
 
 
 class IngestionPipeline:
@@ -226,13 +668,54 @@ class IngestionPipeline:
 
     def __init__(self):
         self.processor = DocumentProcessor()
+        self._bulk_runs = 0
+        self._indexing_threshold = DEFAULT_INDEXING_THRESHOLD
+
+    @asynccontextmanager
+    async def _bulk_ingest(self):
+        """Defer HNSW indexing while a large batch is uploaded, then index once
+
+        Uses indexing_threshold=0 rather than hnsw m=0: changing m on a populated
+        collection rebuilds every existing graph, while the threshold only defers
+        indexing of the newly written segments. Overlapping runs are ref-counted so
+        indexing is restored only when the last one finishes.
+        """
+        if self._bulk_runs == 0:
+            try:
+                info = await qdrant_client.get_collection(COLLECTION_NAME)
+                self._indexing_threshold = (
+                    info.config.optimizer_config.indexing_threshold or DEFAULT_INDEXING_THRESHOLD
+                )
+                await qdrant_client.update_collection(
+                    collection_name=COLLECTION_NAME,
+                    optimizers_config=OptimizersConfigDiff(indexing_threshold=0),
+                )
+                logger.info("Vector indexing paused for bulk ingestion")
+            except Exception as e:
+                logger.warning(f"Could not pause vector indexing: {e}")
+        self._bulk_runs += 1
+        try:
+            yield
+        finally:
+            self._bulk_runs -= 1
+            if self._bulk_runs == 0:
+                try:
+                    await qdrant_client.update_collection(
+                        collection_name=COLLECTION_NAME,
+                        optimizers_config=OptimizersConfigDiff(
+                            indexing_threshold=self._indexing_threshold
+                        ),
+                    )
+                    logger.info("Vector indexing resumed after bulk ingestion")
+                except Exception as e:
+                    logger.error(f"Failed to resume vector indexing: {e}")
 
     async def _record_url_activity(self, payload: Dict[str, Any]) -> None:
         logger.info("Persisting URL activity %s", payload.get("id"))
         if not payload.get("url"):
             raise ValueError("URL is required for activity records")
         try:
-            supabase.table(URL_ACTIVITY_TABLE).upsert(
+            await supabase.table(URL_ACTIVITY_TABLE).upsert(
                 payload, on_conflict="id"
             ).execute()
         except Exception as exc:
@@ -305,14 +788,14 @@ class IngestionPipeline:
         try:
             logger.info(f"🌐 Processing URL: {url}")
 
-            text = self.processor._extract_from_url(url)
+            text = await self.processor._extract_from_url(url)
             if not text or not text.strip():
                 raise Exception("No text extracted from URL")
 
             metadata = {
                 "source": "url",
                 "url": url,
-                "processed_at": datetime.now().isoformat(),
+                "processed_at": datetime.now(timezone.utc).isoformat(),
                 "text_length": len(text),
             }
 
@@ -324,9 +807,6 @@ class IngestionPipeline:
             chunks = self.processor.chunk_text(text, metadata)
             logger.info(f"📦 Created {len(chunks)} chunks from URL")
 
-            for chunk in chunks:
-                chunk.metadata["chunk_count"] = len(chunks)
-
             embeddings_list = await self.processor.generate_embeddings(chunks)
             logger.info(f"✅ Generated {len(embeddings_list)} embeddings")
 
@@ -334,7 +814,8 @@ class IngestionPipeline:
             path_part = parsed_url.path.replace("/", "_") or "root"
             document_id = f"url_{parsed_url.netloc}_{path_part}"
 
-            await self.processor.store_in_qdrant(chunks, embeddings_list, document_id)
+            # The URL activity row reports this result, so wait until the write is applied
+            await self.processor.store_in_qdrant(chunks, embeddings_list, document_id, wait=True)
 
             logger.info(f"🎉 Successfully processed URL: {url}")
             return {
@@ -349,42 +830,51 @@ class IngestionPipeline:
             logger.error(f"❌ Error processing URL {url}: {str(e)}")
             return {"status": "error", "error": str(e)}
 
-    async def process_document_by_path(self, file_path: str) -> Dict[str, Any]:
-        """Process a document by its exact path in Supabase storage"""
-        try:
-            logger.info(f"🚀 Processing document: {file_path}")
+    async def _load_document(self, file_path: str) -> Tuple[str, str, List[LangChainDocument]]:
+        """Download, extract and chunk a stored document; returns (file name, text, chunks)"""
+        # Download file from Supabase
+        response = await docs_bucket.download(file_path)
+        if not response:
+            raise Exception(f"Failed to download file: {file_path}")
 
-            # Download file from Supabase
-            response = supabase.storage.from_("Docs").download(file_path)
-            if not response:
-                raise Exception(f"Failed to download file: {file_path}")
+        # Extract filename from path
+        file_name = file_path.split("/")[-1] if "/" in file_path else file_path
+        logger.info(f"📁 Processing file: {file_name}")
 
-            # Extract filename from path
-            file_name = file_path.split("/")[-1] if "/" in file_path else file_path
-            logger.info(f"📁 Processing file: {file_name}")
+        # Extract text (CPU-bound parsing runs in a worker thread)
+        text = await asyncio.to_thread(
+            self.processor.extract_text_from_file, response, file_name
+        )
+        if not text.strip():
+            raise Exception("No text extracted from document")
 
-            # Extract text
-            text = self.processor.extract_text_from_file(response, file_name)
-            if not text.strip():
-                raise Exception("No text extracted from document")
+        logger.info(f"📄 Extracted {len(text)} characters")
 
-            logger.info(f"📄 Extracted {len(text)} characters")
+        # Create metadata
+        metadata = {
+            "source": "file",
+            "file_name": file_name,
+            "file_path": file_path,
+            "processed_at": datetime.now(timezone.utc).isoformat(),
+            "text_length": len(text),
+        }
 
-            # Create metadata
-            metadata = {
-                "source": "file",
-                "file_name": file_name,
-                "file_path": file_path,
-                "processed_at": datetime.now().isoformat(),
-                "text_length": len(text),
-            }
+        # Chunk text
+        chunks = self.processor.chunk_text(text, metadata)
+        logger.info(f"📦 Created {len(chunks)} chunks")
+        return file_name, text, chunks
 
-            # Chunk text
-            chunks = self.processor.chunk_text(text, metadata)
-            logger.info(f"📦 Created {len(chunks)} chunks")
+    async def process_document_by_path(
+        self, file_path: str, wait: bool = True
+    ) -> Dict[str, Any]:
+        """Process a document by its exact path in Supabase storage
 
-            for chunk in chunks:
-                chunk.metadata["chunk_count"] = len(chunks)
+        ``wait`` is passed to store_in_qdrant; bulk runs turn it off.
+        """
+        try:
+            logger.info(f"🚀 Processing document: {file_path}")
+
+            file_name, text, chunks = await self._load_document(file_path)
 
             # Generate embeddings
             logger.info(f"🧠 Generating embeddings...")
@@ -392,9 +882,11 @@ class IngestionPipeline:
             logger.info(f"✅ Generated {len(embeddings_list)} embeddings")
 
             # Store in Qdrant
-            document_id = file_path.replace("/", "_").replace("-", "_")
+            document_id = document_id_for_path(file_path)
             logger.info(f"💾 Storing in Qdrant...")
-            await self.processor.store_in_qdrant(chunks, embeddings_list, document_id)
+            await self.processor.store_in_qdrant(
+                chunks, embeddings_list, document_id, wait=wait
+            )
 
             logger.info(f"🎉 Successfully processed {file_name}")
             return {
@@ -409,26 +901,78 @@ class IngestionPipeline:
             logger.error(f"❌ Error processing {file_path}: {str(e)}")
             return {"status": "error", "error": str(e)}
 
-    async def is_document_processed(self, file_path: str) -> bool:
-        """Check if a document has already been processed"""
-        try:
-            # Check if any chunks exist for this document in Qdrant
-            document_id = file_path.replace("/", "_").replace("-", "_")
-
-            # Search for existing chunks with this document_id
-            search_result = qdrant_client.scroll(
-                collection_name=COLLECTION_NAME,
-                scroll_filter={
-                    "must": [{"key": "document_id", "match": {"value": document_id}}]
-                },
-                limit=1,
-            )
-
-            return len(search_result[0]) > 0
+    async def processed_document_ids(self, document_ids: List[str]) -> set[str]:
+        """Return the given document_ids that already have chunks in Qdrant
 
+        Scrolls only the document_id payload of matching points, 1024 per page, so a
+        batch costs a handful of requests instead of one per file.
+        """
+        existing_ids: set[str] = set()
+        try:
+            # Bound the size of each MatchAny filter for very large buckets
+            for start in range(0, len(document_ids), 1024):
+                scroll_filter = Filter(
+                    must=[
+                        FieldCondition(
+                            key="document_id",
+                            match=MatchAny(any=document_ids[start : start + 1024]),
+                        )
+                    ]
+                )
+                next_page = None
+                while True:
+                    points, next_page = await qdrant_client.scroll(
+                        collection_name=COLLECTION_NAME,
+                        scroll_filter=scroll_filter,
+                        limit=1024,
+                        offset=next_page,
+                        with_payload=["document_id"],
+                        with_vectors=False,
+                    )
+                    existing_ids.update(
+                        point.payload["document_id"] for point in points if point.payload
+                    )
+                    if next_page is None:
+                        break
         except Exception as e:
-            logger.warning(f"Could not check if document is processed: {e}")
-            return False
+            logger.warning(f"Could not check which documents are processed: {e}")
+        return existing_ids
+
+    async def _list_file_paths(self, user_id: str | None = None) -> List[str]:
+        """List document paths in the bucket, or in the user's folder when user_id is given"""
+        # Determine the path to list. If user_id is provided, list inside that user's folder.
+        list_path = user_id or ""
+
+        # Get all files from Supabase under list_path
+        all_files = await docs_bucket.list(list_path)
+
+        # Supabase may return folder entries (directories) as list items without an 'id'.
+        # Also Supabase may include a placeholder file named '.emptyFolderPlaceholder' when a folder
+        # is empty — skip those as they are not real documents.
+        file_items = [
+            f
+            for f in (all_files or [])
+            if f.get("id") and not (f.get("name") or "").endswith(".emptyFolderPlaceholder")
+        ]
+        logger.info(
+            f"📋 Found {len(all_files or [])} items at '{list_path}', {len(file_items)} files to process (placeholders skipped)"
+        )
+
+        file_paths = []
+        for file_info in file_items:
+            # file_info['name'] may be returned as a basename when listing a folder.
+            # Ensure we construct the full path relative to the bucket. If we listed a user folder
+            # (list_path != ""), prefix the filename with the folder name when needed.
+            raw_name = file_info.get("name") or ""
+            if list_path:
+                if raw_name.startswith(list_path + "/") or raw_name == list_path:
+                    file_path = raw_name
+                else:
+                    file_path = f"{list_path.rstrip('/')}/{raw_name.lstrip('/')}"
+            else:
+                file_path = raw_name
+            file_paths.append(file_path)
+        return file_paths
 
     async def process_all_documents(
         self, force_reprocess: bool = False, user_id: str | None = None
@@ -439,61 +983,58 @@ class IngestionPipeline:
         try:
             logger.info("🔄 Starting batch processing of all documents")
 
-            # Determine the path to list. If user_id is provided, list inside that user's folder.
-            list_path = user_id or ""
+            file_paths = await self._list_file_paths(user_id)
 
-            # Get all files from Supabase under list_path
-            all_files = supabase.storage.from_("Docs").list(list_path)
+            # Check which files are already processed (unless force reprocess) in bulk
+            if force_reprocess:
+                already_processed = [False] * len(file_paths)
+            else:
+                document_ids = [document_id_for_path(file_path) for file_path in file_paths]
+                existing_ids = await self.processed_document_ids(document_ids)
+                already_processed = [
+                    document_id in existing_ids for document_id in document_ids
+                ]
 
-            # Supabase may return folder entries (directories) as list items without an 'id'.
-            # Also Supabase may include a placeholder file named '.emptyFolderPlaceholder' when a folder
-            # is empty — skip those as they are not real documents.
-            file_items = [
-                f
-                for f in (all_files or [])
-                if f.get("id") and not (f.get("name") or "").endswith(".emptyFolderPlaceholder")
-            ]
-            logger.info(
-                f"📋 Found {len(all_files or [])} items at '{list_path}', {len(file_items)} files to process (placeholders skipped)"
-            )
+            # Bounded concurrency: the semaphore is the throttle for OpenAI/Qdrant load
+            semaphore = asyncio.Semaphore(Config.INGEST_CONCURRENCY)
 
-            results = []
-            skipped = 0
+            async def _process(file_path: str) -> Dict[str, Any]:
+                async with semaphore:
+                    logger.info(f"🔄 Processing: {file_path}")
+                    return await self.process_document_by_path(file_path, wait=False)
 
-            for file_info in file_items:
-                # file_info['name'] may be returned as a basename when listing a folder.
-                # Ensure we construct the full path relative to the bucket. If we listed a user folder
-                # (list_path != ""), prefix the filename with the folder name when needed.
-                raw_name = file_info.get("name") or ""
-                if list_path:
-                    if raw_name.startswith(list_path + "/") or raw_name == list_path:
-                        file_path = raw_name
-                    else:
-                        file_path = f"{list_path.rstrip('/')}/{raw_name.lstrip('/')}"
-                else:
-                    file_path = raw_name
+            results: List[Dict[str, Any] | None] = [None] * len(file_paths)
+            skipped = 0
+            pending: List[Tuple[int, str]] = []
 
-                # Check if already processed (unless force reprocess)
-                if not force_reprocess and await self.is_document_processed(file_path):
+            for index, (file_path, processed) in enumerate(zip(file_paths, already_processed)):
+                if processed:
                     logger.info(f"⏭️ Skipping already processed: {file_path}")
                     skipped += 1
-                    results.append(
-                        {
-                            "file_path": file_path,
-                            "result": {
-                                "status": "skipped",
-                                "message": "Already processed",
-                            },
-                        }
-                    )
-                    continue
+                    results[index] = {
+                        "file_path": file_path,
+                        "result": {
+                            "status": "skipped",
+                            "message": "Already processed",
+                        },
+                    }
+                else:
+                    pending.append((index, file_path))
 
-                logger.info(f"🔄 Processing: {file_path}")
-                result = await self.process_document_by_path(file_path)
-                results.append({"file_path": file_path, "result": result})
+            async def _process_pending() -> List[Any]:
+                return await asyncio.gather(
+                    *(_process(file_path) for _, file_path in pending), return_exceptions=True
+                )
 
-                # Small delay to avoid overwhelming the system
-                await asyncio.sleep(1)
+            if len(pending) >= BULK_INGEST_MIN_DOCUMENTS:
+                async with self._bulk_ingest():
+                    outcomes = await _process_pending()
+            else:
+                outcomes = await _process_pending()
+            for (index, file_path), outcome in zip(pending, outcomes):
+                if isinstance(outcome, BaseException):
+                    outcome = {"status": "error", "error": str(outcome)}
+                results[index] = {"file_path": file_path, "result": outcome}
 
             successful = sum(1 for r in results if r["result"]["status"] == "success")
             failed = sum(1 for r in results if r["result"]["status"] == "error")
@@ -515,6 +1056,197 @@ class IngestionPipeline:
             logger.error(f"❌ Batch processing error: {str(e)}")
             return {"status": "error", "error": str(e)}
 
+    async def _embed_with_batch_api(
+        self, texts: List[str], jobs: List[Dict[str, Any]] | None = None
+    ) -> List[List[float] | None]:
+        """Embed texts through one OpenAI Batch API job (half price, 24h completion window)
+
+        Returns one vector per text, or None where the batch request for it failed. When
+        ``jobs`` is given, the job's ids and status are appended to it and kept up to date.
+        """
+        lines = []
+        for start in range(0, len(texts), BATCH_REQUEST_INPUTS):
+            request = {
+                "custom_id": str(start),
+                "method": "POST",
+                "url": "/v1/embeddings",
+                "body": {
+                    "model": EMBEDDING_MODEL,
+                    "input": texts[start : start + BATCH_REQUEST_INPUTS],
+                    "dimensions": EMBEDDING_DIMENSIONS,
+                },
+            }
+            lines.append(json.dumps(request))
+
+        batch_file = await openai_client.with_options(timeout=600).files.create(
+            file=("embeddings.jsonl", "\n".join(lines).encode()), purpose="batch"
+        )
+        batch = await openai_client.batches.create(
+            input_file_id=batch_file.id, endpoint="/v1/embeddings", completion_window="24h"
+        )
+        logger.info(
+            f"📨 Submitted embedding batch {batch.id} (input file {batch_file.id}, "
+            f"{len(texts)} inputs)"
+        )
+        job = {
+            "batch_id": batch.id,
+            "input_file_id": batch_file.id,
+            "inputs": len(texts),
+            "status": batch.status,
+            "output_file_id": None,
+        }
+        if jobs is not None:
+            jobs.append(job)
+
+        while batch.status not in BATCH_FINAL_STATES:
+            await asyncio.sleep(BATCH_POLL_SECONDS)
+            batch = await openai_client.batches.retrieve(batch.id)
+            job["status"] = batch.status
+        job["output_file_id"] = batch.output_file_id
+        logger.info(f"📬 Embedding batch {batch.id} finished: {batch.status}")
+
+        vectors: List[List[float] | None] = [None] * len(texts)
+        if not batch.output_file_id:
+            return vectors
+
+        output = await openai_client.with_options(timeout=600).files.content(
+            batch.output_file_id
+        )
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get("response") or {}
+            if result.get("error") or response.get("status_code") != 200:
+                logger.warning(f"Batch request {result.get('custom_id')} failed: {result.get('error')}")
+                continue
+            start = int(result["custom_id"])
+            for item in response["body"]["data"]:
+                vectors[start + item["index"]] = item["embedding"]
+        return vectors
+
+    async def process_all_documents_batch(
+        self,
+        force_reprocess: bool = False,
+        user_id: str | None = None,
+        run: Dict[str, Any] | None = None,
+    ) -> Dict[str, Any]:
+        """Like process_all_documents, but embeds every chunk through the OpenAI Batch API
+
+        Meant for large offline backfills: costs half as much as synchronous embeddings
+        and is not bound by per-minute rate limits, but can take up to 24 hours. Chunks
+        are held in memory until their batch completes. Progress (stage, submitted batch
+        jobs and finally the result) is recorded in ``run`` when one is passed.
+        """
+        run = run if run is not None else {}
+        run.setdefault("jobs", [])
+        try:
+            run["status"] = "loading"
+            logger.info("🔄 Starting Batch API processing of all documents")
+
+            file_paths = await self._list_file_paths(user_id)
+            if not force_reprocess:
+                existing_ids = await self.processed_document_ids(
+                    [document_id_for_path(file_path) for file_path in file_paths]
+                )
+                file_paths = [
+                    file_path
+                    for file_path in file_paths
+                    if document_id_for_path(file_path) not in existing_ids
+                ]
+
+            semaphore = asyncio.Semaphore(Config.INGEST_CONCURRENCY)
+
+            async def _load(file_path: str):
+                async with semaphore:
+                    return await self._load_document(file_path)
+
+            loaded = await asyncio.gather(
+                *(_load(file_path) for file_path in file_paths), return_exceptions=True
+            )
+
+            results: List[Dict[str, Any]] = []
+            documents: List[Tuple[str, List[LangChainDocument]]] = []
+            for file_path, outcome in zip(file_paths, loaded):
+                if isinstance(outcome, BaseException):
+                    logger.error(f"❌ Error loading {file_path}: {outcome}")
+                    results.append(
+                        {"file_path": file_path, "result": {"status": "error", "error": str(outcome)}}
+                    )
+                else:
+                    documents.append((file_path, outcome[2]))
+
+            # Embed every chunk first, BATCH_MAX_INPUTS per job; a document larger than one
+            # job simply spans several. Jobs can take hours, so indexing is not paused yet.
+            run["status"] = "embedding"
+            texts = [chunk.page_content for _, chunks in documents for chunk in chunks]
+            job_starts = range(0, len(texts), BATCH_MAX_INPUTS)
+            outcomes = await asyncio.gather(
+                *(
+                    self._embed_with_batch_api(
+                        texts[start : start + BATCH_MAX_INPUTS], jobs=run["jobs"]
+                    )
+                    for start in job_starts
+                ),
+                return_exceptions=True,
+            )
+            vectors: List[List[float] | None] = []
+            for start, outcome in zip(job_starts, outcomes):
+                if isinstance(outcome, BaseException):
+                    logger.error(f"❌ Embedding batch failed: {outcome}")
+                    outcome = [None] * len(texts[start : start + BATCH_MAX_INPUTS])
+                vectors.extend(outcome)
+
+            async def _store_all():
+                offset = 0
+                for file_path, chunks in documents:
+                    document_vectors = vectors[offset : offset + len(chunks)]
+                    offset += len(chunks)
+                    if any(vector is None for vector in document_vectors):
+                        result = {"status": "error", "error": "Batch embedding failed"}
+                    else:
+                        document_id = document_id_for_path(file_path)
+                        try:
+                            await self.processor.store_in_qdrant(
+                                chunks, document_vectors, document_id
+                            )
+                            result = {
+                                "status": "success",
+                                "document_id": document_id,
+                                "chunks_created": len(chunks),
+                            }
+                        except Exception as e:
+                            logger.error(f"❌ Error storing {file_path}: {str(e)}")
+                            result = {"status": "error", "error": str(e)}
+                    results.append({"file_path": file_path, "result": result})
+
+            # Only the upserts run with indexing paused, once all vectors are in hand
+            run["status"] = "storing"
+            if len(documents) >= BULK_INGEST_MIN_DOCUMENTS:
+                async with self._bulk_ingest():
+                    await _store_all()
+            else:
+                await _store_all()
+
+            successful = sum(1 for r in results if r["result"]["status"] == "success")
+            failed = len(results) - successful
+            logger.info(f"✅ Batch API processing complete: {successful} successful, {failed} failed")
+            result = {
+                "status": "completed",
+                "total_files": len(results),
+                "successful": successful,
+                "failed": failed,
+                "results": results,
+            }
+
+        except Exception as e:
+            logger.error(f"❌ Batch API processing error: {str(e)}")
+            result = {"status": "error", "error": str(e)}
+
+        run["status"] = result["status"]
+        run["result"] = result
+        return result
+
     def _update_processing_status(
         self, file_path: str, status: str, chunks_count: int = 0, error: str = None
     ):
@@ -533,14 +1265,18 @@ class IngestionPipeline:
             return []
 
         query_embedding = await embeddings.aembed_query(query)
-        search_results = qdrant_client.search(
+        search_results = await qdrant_client.query_points(
             collection_name=COLLECTION_NAME,
-            query_vector=query_embedding,
+            query=query_embedding,
             limit=top_k,
+            # Search the int8 index, then rescore 2x candidates with the full vectors
+            search_params=SEARCH_PARAMS,
+            with_payload=True,
+            with_vectors=False,
         )
 
         documents = []
-        for result in search_results:
+        for result in search_results.points:
             payload = result.payload or {}
             documents.append(
                 {
@@ -558,11 +1294,43 @@ class IngestionPipeline:
         temperature: float = 0.2,
     ) -> str:
         if not context_docs:
-            return "I couldn't find relevant information in the knowledge base."
+            return NO_CONTEXT_ANSWER
 
+        completion = await openai_client.responses.create(
+            model="gpt-4o-mini",
+            input=self._build_prompt(query, context_docs),
+            temperature=temperature,
+        )
+
+        answer = completion.output_text.strip()
+        return answer
+
+    async def stream_answer(
+        self,
+        query: str,
+        context_docs: List[Dict[str, Any]],
+        temperature: float = 0.2,
+    ) -> AsyncIterator[str]:
+        """Like generate_answer, but yields the answer text as the model produces it"""
+        if not context_docs:
+            yield NO_CONTEXT_ANSWER
+            return
+
+        stream = await openai_client.responses.create(
+            model="gpt-4o-mini",
+            input=self._build_prompt(query, context_docs),
+            temperature=temperature,
+            stream=True,
+        )
+        async for event in stream:
+            if event.type == "response.output_text.delta":
+                yield event.delta
+
+    @staticmethod
+    def _build_prompt(query: str, context_docs: List[Dict[str, Any]]) -> str:
         context_text = "\n\n".join(doc.get("text", "") for doc in context_docs)
 
-        prompt = (
+        return (
             "You are a helpful assistant that answers questions using the provided context. "
             "If the context does not contain the answer, say that you don't have enough information.\n\n"
             "Context:\n"
@@ -572,24 +1340,85 @@ class IngestionPipeline:
             "Answer:"
         )
 
-        from openai import AsyncOpenAI
-
-        client = AsyncOpenAI(api_key=Config.OPENAI_API_KEY)
-        completion = await client.responses.create(
-            model="gpt-4o-mini",
-            input=prompt,
-            temperature=temperature,
-        )
-
-        answer = completion.output_text.strip()
-        return answer
-
 
 # Initialize pipeline
 pipeline = IngestionPipeline()
 
 # FastAPI app
-app = FastAPI(title="Document Ingestion Pipeline")
+# orjson encodes response bodies several times faster than the stdlib json module
+DefaultResponse = ORJSONResponse if orjson is not None else JSONResponse
+app = FastAPI(title="Document Ingestion Pipeline", default_response_class=DefaultResponse)
+
+
+@app.on_event("startup")
+async def init_supabase():
+    global supabase, docs_bucket
+    supabase = await get_async_supabase_client()
+    docs_bucket = supabase.storage.from_("Docs")
+
+
+@app.on_event("startup")
+async def init_vector_store():
+    """Make sure the collection exists before any ingestion or search"""
+    # Doubles as the Qdrant health check: an unreachable server fails startup here
+    await ensure_collection()
+    transport = "gRPC" if Config.QDRANT_PREFER_GRPC else "REST"
+    logger.info(f"✅ Connected to Qdrant at {Config.QDRANT_URL} over {transport}")
+
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await http_client.aclose()
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(cancel_futures=True)
+
+
+# File paths from storage webhooks, drained by _ingest_worker tasks
+_ingest_queue: asyncio.Queue[str] = asyncio.Queue(maxsize=WEBHOOK_QUEUE_SIZE)
+_ingest_workers: List[asyncio.Task] = []
+# (file path, storage object id) -> monotonic time the upload was queued, oldest first
+_recent_uploads: "OrderedDict[Tuple[str, Any], float]" = OrderedDict()
+
+
+def _is_redelivery(key: Tuple[str, Any]) -> bool:
+    """Remember ``key`` and report whether it was already queued within the dedupe window"""
+    now = time.monotonic()
+    while _recent_uploads:
+        oldest_key, queued_at = next(iter(_recent_uploads.items()))
+        if now - queued_at < WEBHOOK_DEDUPE_SECONDS and len(_recent_uploads) < 1024:
+            break
+        del _recent_uploads[oldest_key]
+    if key in _recent_uploads:
+        return True
+    _recent_uploads[key] = now
+    return False
+
+
+async def _ingest_worker() -> None:
+    while True:
+        file_path = await _ingest_queue.get()
+        try:
+            await pipeline.process_document_by_path(file_path)
+        except Exception as e:
+            logger.error(f"❌ Background ingestion failed for {file_path}: {e}")
+        finally:
+            _ingest_queue.task_done()
+
+
+@app.on_event("startup")
+async def start_ingest_workers():
+    _ingest_workers.extend(
+        asyncio.create_task(_ingest_worker()) for _ in range(WEBHOOK_INGEST_WORKERS)
+    )
+
+
+@app.on_event("shutdown")
+async def stop_ingest_workers():
+    for worker in _ingest_workers:
+        worker.cancel()
+    await asyncio.gather(*_ingest_workers, return_exceptions=True)
+    _ingest_workers.clear()
+
 
 if analytics_router:
     logger.info("Analytics routes enabled")
@@ -598,7 +1427,8 @@ else:
     logger.warning("Analytics routes disabled (module not available)")
 
 # Add CORS middleware
-# Validate required config (this will raise on startup if required env vars are missing)
+# Validate required config (this will raise on startup if required env vars are missing).
+# Normally already done when RAG.config was imported, in which case this is a no-op.
 Config.validate()
 
 # Load CORS origins from environment variable `CORS_ORIGINS` (comma-separated, no fallback)
@@ -606,11 +1436,10 @@ cors_env = Config.CORS_ORIGINS
 if not cors_env:
     raise RuntimeError("CORS_ORIGINS environment variable is required and must contain a comma-separated list of origins")
 
-allow_origins = [origin.strip() for origin in cors_env.split(",") if origin.strip()]
-
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=allow_origins,
+    # Pre-split frozenset: the middleware's per-request `origin in allow_origins` is a hash lookup
+    allow_origins=Config.CORS_ORIGINS_SET,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -632,6 +1461,8 @@ class UrlIngestionRequest(BaseModel):
     url: str
     request_id: str
     metadata: Dict[str, Any] | None = None
+    # Return 202 right away and ingest in the background; poll /url-activities for the outcome
+    background: bool = False
 
 
 class WidgetTokenRequest(BaseModel):
@@ -645,11 +1476,13 @@ class WidgetChatRequest(BaseModel):
     top_k: int | None = 5
     temperature: float | None = 0.2
     conversation_id: str | None = None
+    # Stream the answer back as NDJSON events instead of a single JSON body
+    stream: bool = False
 
 
-from typing import Optional
-
-
+# Pure function of the header value (signatures are not verified here), so repeat requests
+# with the same token skip the base64/JSON decode
+@lru_cache(maxsize=4096)
 def _extract_user_id_from_auth(authorization: str | None) -> str:
     try:
         if not authorization or not authorization.startswith("Bearer "):
@@ -665,31 +1498,125 @@ def _extract_user_id_from_auth(authorization: str | None) -> str:
         return "anonymous"
 
 
+async def current_user(authorization: str = Header(None)) -> str:
+    """Dependency resolving the caller's user id ("anonymous" without a usable token)"""
+    return _extract_user_id_from_auth(authorization)
+
+
+# Verified widget token payloads, keyed by token hash; entries live at most
+# WIDGET_TOKEN_CACHE_SECONDS and never past the token's own exp
+WIDGET_TOKEN_CACHE_SECONDS = 30
+WIDGET_TOKEN_CACHE_SIZE = 10_000
+_widget_token_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+
+def _decode_widget_token(token: str) -> Dict[str, Any]:
+    """Verify a widget token, reusing the payload of a recent identical token
+
+    Raises jwt.PyJWTError for invalid tokens, which are never cached.
+    """
+    import jwt
+
+    key = hashlib.sha256(token.encode()).hexdigest()
+    now = time.time()
+    entry = _widget_token_cache.get(key)
+    if entry is not None:
+        if entry[0] > now:
+            return entry[1]
+        del _widget_token_cache[key]
+
+    decoded = jwt.decode(token, Config.EMBED_SECRET, algorithms=["HS256"])
+    expires_at = now + WIDGET_TOKEN_CACHE_SECONDS
+    if decoded.get("exp") is not None:
+        expires_at = min(expires_at, float(decoded["exp"]))
+    _widget_token_cache[key] = (expires_at, decoded)
+    while len(_widget_token_cache) > WIDGET_TOKEN_CACHE_SIZE:
+        _widget_token_cache.popitem(last=False)
+    return decoded
+
+
+def _ndjson_line(event: Dict[str, Any]) -> bytes:
+    """Encode one streamed event as a newline-terminated JSON line"""
+    if orjson is not None:
+        return orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(event) + "\n").encode()
+
+
+# Chat turns are written by one flusher task, up to CHAT_TURN_BATCH_SIZE rows per insert
+CHAT_TURN_BATCH_SIZE = 50
+CHAT_TURN_QUEUE_SIZE = 10_000
+_chat_turn_queue: asyncio.Queue[Dict[str, Any]] = asyncio.Queue(maxsize=CHAT_TURN_QUEUE_SIZE)
+_chat_turn_flusher_task: asyncio.Task | None = None
+
+
 def _record_chat_turn(
     *,
+    turn_id: str,
     site_id: str,
     conversation_id: str,
     user_message: str,
     assistant_message: str | None,
     status: str,
     metadata: Dict[str, Any] | None = None,
-) -> Optional[str]:
+) -> None:
+    """Queue a chat turn for the background flusher; never blocks the response"""
+    payload = {
+        "id": turn_id,
+        "conversation_id": conversation_id,
+        "site_id": site_id,
+        "user_message": user_message,
+        "assistant_message": assistant_message,
+        "status": status,
+        "metadata": metadata or {},
+    }
     try:
-        payload = {
-            "conversation_id": conversation_id,
-            "site_id": site_id,
-            "user_message": user_message,
-            "assistant_message": assistant_message,
-            "status": status,
-            "metadata": metadata or {},
-        }
-        response = supabase.table("chat_turns").insert(payload).execute()
-        if response.data:
-            return response.data[0].get("id")
-        return None
+        _chat_turn_queue.put_nowait(payload)
+    except asyncio.QueueFull:
+        logger.warning("Chat turn queue full; dropping turn %s", turn_id)
+
+
+async def _insert_chat_turns(batch: List[Dict[str, Any]]) -> None:
+    try:
+        await supabase.table("chat_turns").insert(batch).execute()
     except Exception as exc:
-        logger.warning("Failed to record chat turn: %s", exc, exc_info=True)
-        return None
+        logger.warning("Failed to record %d chat turns: %s", len(batch), exc, exc_info=True)
+
+
+def _drain_chat_turns(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    while len(batch) < CHAT_TURN_BATCH_SIZE:
+        try:
+            batch.append(_chat_turn_queue.get_nowait())
+        except asyncio.QueueEmpty:
+            break
+    return batch
+
+
+async def _chat_turn_flusher() -> None:
+    while True:
+        batch = _drain_chat_turns([await _chat_turn_queue.get()])
+        await _insert_chat_turns(batch)
+
+
+@app.on_event("startup")
+async def start_chat_turn_flusher():
+    global _chat_turn_flusher_task
+    _chat_turn_flusher_task = asyncio.create_task(_chat_turn_flusher())
+
+
+@app.on_event("shutdown")
+async def stop_chat_turn_flusher():
+    if _chat_turn_flusher_task is not None:
+        _chat_turn_flusher_task.cancel()
+        await asyncio.gather(_chat_turn_flusher_task, return_exceptions=True)
+    # Write whatever is still queued before exiting
+    while not _chat_turn_queue.empty():
+        await _insert_chat_turns(_drain_chat_turns([]))
+
+
+# Registered after every hook that may still write to Supabase while shutting down
+@app.on_event("shutdown")
+async def close_supabase():
+    await close_async_supabase_client()
 
 
 @app.post("/process-document")
@@ -721,13 +1648,70 @@ async def process_all_documents(force_reprocess: bool = False):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# The latest Batch API backfill and its progress; only one may be in flight at a time
+_batch_backfill_task: asyncio.Task | None = None
+_batch_backfill_run: Dict[str, Any] | None = None
+
+
+@app.post("/process-all-batch")
+async def process_all_documents_batch(force_reprocess: bool = False):
+    """Backfill the bucket through the OpenAI Batch API; completes within 24 hours"""
+    global _batch_backfill_task, _batch_backfill_run
+    if _batch_backfill_task is not None and not _batch_backfill_task.done():
+        raise HTTPException(status_code=409, detail="Batch processing already in progress")
+    # No await between the check and the assignment, so concurrent requests cannot both start
+    _batch_backfill_run = {
+        "run_id": str(uuid4()),
+        "status": "queued",
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "jobs": [],
+    }
+    _batch_backfill_task = asyncio.create_task(
+        pipeline.process_all_documents_batch(
+            force_reprocess=force_reprocess, run=_batch_backfill_run
+        )
+    )
+    return DefaultResponse(
+        status_code=202,
+        content={
+            "message": "Batch processing started",
+            "run_id": _batch_backfill_run["run_id"],
+            "status_url": "/process-all-batch",
+        },
+    )
+
+
+@app.get("/process-all-batch")
+async def batch_backfill_status():
+    """Stage, OpenAI batch job ids and (once finished) the result of the latest backfill"""
+    if _batch_backfill_run is None:
+        raise HTTPException(status_code=404, detail="No batch processing run")
+    return _batch_backfill_run
+
+
+@app.on_event("shutdown")
+async def stop_batch_backfill():
+    if _batch_backfill_task is None or _batch_backfill_task.done():
+        return
+    # The OpenAI jobs keep running and their output files stay downloadable; log the
+    # ids so the vectors can be recovered instead of paying for a second run
+    pending = [job for job in _batch_backfill_run["jobs"] if job["status"] not in BATCH_FINAL_STATES]
+    logger.warning(
+        f"Stopping batch processing run {_batch_backfill_run['run_id']} "
+        f"({_batch_backfill_run['status']}); OpenAI batch jobs: {_batch_backfill_run['jobs']}; "
+        f"still running: {[job['batch_id'] for job in pending]}"
+    )
+    _batch_backfill_task.cancel()
+    await asyncio.gather(_batch_backfill_task, return_exceptions=True)
+    _batch_backfill_run["status"] = "cancelled"
+
+
 @app.post("/process-new-only")
-async def process_new_documents(authorization: str = Header(None)):
+async def process_new_documents(user_id: str = Depends(current_user)):
     """Process only new documents for the authenticated user (skip already processed ones)"""
     try:
         # Require authorization to ensure we only process files for the requesting user
-        user_id = _extract_user_id_from_auth(authorization)
-        if not authorization or not user_id or user_id == "anonymous":
+        if user_id == "anonymous":
             raise HTTPException(status_code=401, detail="Missing or invalid authorization token")
 
         result = await pipeline.process_all_documents(force_reprocess=False, user_id=user_id)
@@ -750,43 +1734,64 @@ async def process_specific_document(request: ProcessDocumentRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/process-url")
-async def process_url_endpoint(
-    request: UrlIngestionRequest, authorization: str = Header(None)
-):
-    """Process content scraped from a URL and record activity"""
-    # Extract user_id from Supabase JWT token
-    user_id = _extract_user_id_from_auth(authorization)
-
-    await pipeline._record_url_activity_start(
-        request.request_id,
-        request.url,
-        site_id=user_id,
-        user_id=user_id,
-        metadata=request.metadata,
-    )
-    result = await pipeline.process_document_from_url(request.url, user_id)
+async def _run_url_ingest(
+    request_id: str, url: str, user_id: str | None, metadata: Dict[str, Any] | None
+) -> Dict[str, Any]:
+    """Ingest a URL and record the outcome in the URL activity table"""
+    result = await pipeline.process_document_from_url(url, user_id)
     if result.get("status") == "error":
         await pipeline._record_url_activity_result(
-            request.request_id,
+            request_id,
             "error",
-            url=request.url,
+            url=url,
             site_id=user_id,
             user_id=user_id,
             error=result.get("error"),
-            metadata=request.metadata,
+            metadata=metadata,
         )
-        raise HTTPException(status_code=400, detail=result.get("error"))
+        return result
 
     await pipeline._record_url_activity_result(
-        request.request_id,
+        request_id,
         "success",
-        url=request.url,
+        url=url,
         site_id=user_id,
         user_id=user_id,
         chunks_created=result.get("chunks_created"),
+        metadata=metadata,
+    )
+    return result
+
+
+@app.post("/process-url")
+async def process_url_endpoint(
+    request: UrlIngestionRequest,
+    background_tasks: BackgroundTasks,
+    user_id: str = Depends(current_user),
+):
+    """Process content scraped from a URL and record activity"""
+    await pipeline._record_url_activity_start(
+        request.request_id,
+        request.url,
+        site_id=user_id,
+        user_id=user_id,
         metadata=request.metadata,
     )
+
+    if request.background:
+        background_tasks.add_task(
+            _run_url_ingest, request.request_id, request.url, user_id, request.metadata
+        )
+        return DefaultResponse(
+            status_code=202,
+            content={"request_id": request.request_id, "status": "accepted"},
+        )
+
+    result = await _run_url_ingest(
+        request.request_id, request.url, user_id, request.metadata
+    )
+    if result.get("status") == "error":
+        raise HTTPException(status_code=400, detail=result.get("error"))
     return result
 
 
@@ -806,7 +1811,7 @@ async def create_widget_token(request: WidgetTokenRequest):
         }
 
         token = jwt.encode(payload, Config.EMBED_SECRET, algorithm="HS256")
-        return {"token": token, "expires_at": expiry.isoformat()}
+        return {"token": token, "expires_at": expiry.isoformat(), "expires_in": expires_in}
     except Exception as e:
         logger.error(f"Failed to create widget token: {e}")
         raise HTTPException(status_code=500, detail="Could not generate widget token")
@@ -822,7 +1827,7 @@ async def widget_chat(request: WidgetChatRequest, authorization: str = Header(No
 
         token = authorization.split(" ", 1)[1]
         try:
-            decoded = jwt.decode(token, Config.EMBED_SECRET, algorithms=["HS256"])
+            decoded = _decode_widget_token(token)
         except jwt.PyJWTError as exc:  # type: ignore
             logger.error(f"Invalid widget token: {exc}")
             raise HTTPException(status_code=401, detail="Invalid authorization token")
@@ -838,18 +1843,13 @@ async def widget_chat(request: WidgetChatRequest, authorization: str = Header(No
             new_conversation = True
 
         started_at = datetime.now(timezone.utc)
+        # Generated here so the turn can be recorded in the background and the id
+        # still returned to the widget for feedback
+        turn_id = str(uuid4())
+        top_k = request.top_k or 5
+        temperature = request.temperature or 0.2
 
-        documents = await pipeline.retrieve(request.query, top_k=request.top_k or 5)
-        answer = await pipeline.generate_answer(
-            request.query,
-            documents,
-            temperature=request.temperature or 0.2,
-        )
-
-        elapsed_ms = int(
-            (datetime.now(timezone.utc) - started_at).total_seconds() * 1000
-        )
-
+        documents = await pipeline.retrieve(request.query, top_k=top_k)
         document_refs = [
             {
                 "metadata": doc.get("metadata", {}),
@@ -858,16 +1858,17 @@ async def widget_chat(request: WidgetChatRequest, authorization: str = Header(No
             for doc in documents
         ]
 
-        status = "resolved" if answer else "gap"
-
-        turn_id = None
-        if conversation_id:
-            turn_id = _record_chat_turn(
+        def record_turn(answer: str | None) -> None:
+            elapsed_ms = int(
+                (datetime.now(timezone.utc) - started_at).total_seconds() * 1000
+            )
+            _record_chat_turn(
+                turn_id=turn_id,
                 site_id=site_id,
                 conversation_id=conversation_id,
                 user_message=request.query,
                 assistant_message=answer,
-                status=status,
+                status="resolved" if answer else "gap",
                 metadata={
                     "documents": document_refs,
                     "latency_ms": elapsed_ms,
@@ -875,6 +1876,41 @@ async def widget_chat(request: WidgetChatRequest, authorization: str = Header(No
                 },
             )
 
+        if request.stream:
+            async def events():
+                yield _ndjson_line(
+                    {
+                        "type": "meta",
+                        "documents": documents,
+                        "conversation_id": conversation_id,
+                        "new_conversation": new_conversation,
+                        "turn_id": turn_id,
+                    }
+                )
+                parts = []
+                try:
+                    async for delta in pipeline.stream_answer(
+                        request.query, documents, temperature=temperature
+                    ):
+                        parts.append(delta)
+                        yield _ndjson_line({"type": "delta", "text": delta})
+                except Exception as exc:
+                    logger.error(f"Widget chat stream error: {exc}")
+                    yield _ndjson_line({"type": "error", "detail": "Chat service unavailable"})
+                    return
+                answer = "".join(parts).strip()
+                record_turn(answer)
+                yield _ndjson_line({"type": "done", "answer": answer})
+
+            return StreamingResponse(events(), media_type="application/x-ndjson")
+
+        answer = await pipeline.generate_answer(
+            request.query,
+            documents,
+            temperature=temperature,
+        )
+        record_turn(answer)
+
         return {
             "answer": answer,
             "documents": documents,
@@ -889,380 +1925,112 @@ async def widget_chat(request: WidgetChatRequest, authorization: str = Header(No
         raise HTTPException(status_code=500, detail="Chat service unavailable")
 
 
+# Bucket listing served from memory for LIST_DOCUMENTS_TTL seconds; storage webhooks
+# drop it early so new uploads show up straight away
+LIST_DOCUMENTS_TTL = 60
+LIST_DOCUMENTS_HEADERS = {
+    "Cache-Control": f"public, max-age={LIST_DOCUMENTS_TTL}, stale-while-revalidate=300"
+}
+_documents_listing: Tuple[float, List[Dict[str, Any]]] | None = None
+
+
+def _invalidate_documents_listing() -> None:
+    global _documents_listing
+    _documents_listing = None
+
+
 @app.get("/list-documents")
 async def list_documents():
     """List all documents in the Docs bucket"""
+    global _documents_listing
     try:
-        response = supabase.storage.from_("Docs").list("")
-        logger.info(f"📋 Listed {len(response)} documents")
-        return {"documents": response}
+        if _documents_listing is not None and _documents_listing[0] > time.monotonic():
+            response = _documents_listing[1]
+        else:
+            response = await docs_bucket.list("")
+            _documents_listing = (time.monotonic() + LIST_DOCUMENTS_TTL, response)
+            logger.info(f"📋 Listed {len(response)} documents")
+        return DefaultResponse(content={"documents": response}, headers=LIST_DOCUMENTS_HEADERS)
     except Exception as e:
         logger.error(f"Error listing documents: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/url-activities")
-async def list_url_activities(limit: int = 20, authorization: str = Header(None)):
+async def list_url_activities(limit: int = 20, user_id: str = Depends(current_user)):
     """Fetch recent URL ingestion activity logs"""
     try:
-        # Extract user id from Authorization header and only return that user's activities
-        user_id = _extract_user_id_from_auth(authorization)
-
+        # Only return the authenticated user's activities
         # Diagnostic logging to help debug why users may see no activities
-        logger.info("/url-activities requested by user_id=%s", user_id)
+        logger.debug("/url-activities requested by user_id=%s", user_id)
+
+        # Filter in the query so the limit applies to this user's rows only. The id comes
+        # from an unverified token, so it is quoted as a literal inside the or=() list.
+        quoted_uid = '"' + user_id.replace("\\", "\\\\").replace('"', '\\"') + '"'
+        conditions = [
+            f"user_id.eq.{quoted_uid}",
+            f"site_id.eq.{quoted_uid}",
+            f"metadata->>user_id.eq.{quoted_uid}",
+            f"metadata->>site_id.eq.{quoted_uid}",
+        ]
 
-        # Fetch recent activities and filter in Python to avoid DB JSON filtering quirks
-        response = (
+        query = (
             supabase.table(URL_ACTIVITY_TABLE)
-            .select("*")
+            .select(URL_ACTIVITY_COLUMNS)
+            .or_(",".join(conditions))
             .order("started_at", desc=True)
             .limit(limit)
-            .execute()
         )
+        response = await query.execute()
 
         activities = response.data if response and hasattr(response, "data") else []
-        logger.info("/url-activities fetched %d activities (before filtering)", len(activities))
-        try:
-            logger.info("/url-activities sample metadata: %s", [a.get("metadata") for a in activities[:3]])
-        except Exception:
-            pass
-
-        def _belongs_to_user(activity: dict, uid: str) -> bool:
-            # Check top-level fields first
-            if not activity:
-                return False
-            if activity.get("user_id") == uid or activity.get("site_id") == uid:
-                return True
-
-            # Check metadata (may be None or json)
-            meta = activity.get("metadata") or {}
-            try:
-                if isinstance(meta, str):
-                    import json
+        logger.debug("/url-activities fetched %d activities", len(activities))
+        return {"activities": activities}
+    except Exception as e:
+        logger.error(f"Error fetching URL activities: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-                    meta = json.loads(meta)
-            except Exception:
-                meta = {}
 
-            if isinstance(meta, dict):
-                if str(meta.get("user_id")) == str(uid) or str(meta.get("site_id")) == str(uid):
-                    return True
+WIDGET_JS_PATH = Path(__file__).with_name("widget.js")
 
-            return False
 
-        filtered = [a for a in activities if _belongs_to_user(a, user_id)]
-        return {"activities": filtered}
-    except Exception as e:
-        logger.error(f"Error fetching URL activities: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+def _render_widget_script() -> str:
+    """Render the embeddable widget script for WIDGET_SCRIPT_BASE_URL"""
+    script = WIDGET_JS_PATH.read_text(encoding="utf-8")
+    return script.replace("__WIDGET_SCRIPT_BASE_URL__", WIDGET_SCRIPT_BASE_URL)
+
+
+# The script only depends on settings fixed at startup, so render, encode, compress and
+# hash it once. Each encoding gets its own ETag, as they are different representations.
+WIDGET_JS_BYTES = _render_widget_script().encode("utf-8")
+WIDGET_JS_GZIP = gzip.compress(WIDGET_JS_BYTES, compresslevel=9)
+_widget_js_hash = hashlib.blake2b(WIDGET_JS_BYTES, digest_size=16).hexdigest()
+WIDGET_JS_ETAG = f'"{_widget_js_hash}"'
+WIDGET_JS_GZIP_ETAG = f'"{_widget_js_hash}-gzip"'
+WIDGET_JS_HEADERS = {
+    "Cache-Control": "public, max-age=86400",
+    "Vary": "Accept-Encoding",
+    "ETag": WIDGET_JS_ETAG,
+}
+WIDGET_JS_GZIP_HEADERS = {
+    **WIDGET_JS_HEADERS,
+    "Content-Encoding": "gzip",
+    "ETag": WIDGET_JS_GZIP_ETAG,
+}
 
 
 @app.get("/widget.js")
-async def widget_script():
-    script = f"""
-    (function() {{
-      const config = window.supportBotConfig || {{}};
-      const SITE_ID = config.siteId || 'default';
-      const API_BASE = config.apiBase || '{WIDGET_SCRIPT_BASE_URL}';
-      const WIDGET_ID = 'supportbot-widget-container';
-
-      if (document.getElementById(WIDGET_ID)) {{
-        return;
-      }}
-
-      const styles = document.createElement('style');
-      styles.textContent = `
-        .supportbot-widget-bubble {{
-          position: fixed;
-          bottom: 24px;
-          z-index: 9998;
-          width: 56px;
-          height: 56px;
-          border-radius: 50%;
-          display: flex;
-          align-items: center;
-          justify-content: center;
-          box-shadow: 0 10px 40px rgba(15,23,42,0.18);
-          cursor: pointer;
-          transition: transform 0.2s ease;
-        }}
-
-        .supportbot-widget-bubble:hover {{
-          transform: translateY(-3px);
-        }}
-
-        .supportbot-chat-window {{
-          position: fixed;
-          bottom: 90px;
-          width: 360px;
-          height: 520px;
-          border-radius: 16px;
-          box-shadow: 0 20px 60px rgba(15,23,42,0.25);
-          overflow: hidden;
-          display: flex;
-          flex-direction: column;
-          background: #ffffff;
-          z-index: 9999;
-        }}
-      `;
-      document.head.appendChild(styles);
-
-      const container = document.createElement('div');
-      container.id = WIDGET_ID;
-      document.body.appendChild(container);
-
-      const state = {{
-        open: false,
-        messages: [],
-        loading: false,
-        conversationId: null,
-        feedbackByTurn: {{}},
-      }};
-
-      function render() {{
-        const primaryColor = config.primaryColor || '#3B82F6';
-        const backgroundColor = config.backgroundColor || '#FFFFFF';
-        const position = config.position === 'bottom-left' ? 'left' : 'right';
-        const welcomeMessage = config.welcomeMessage || 'Hi there! How can I help you?';
-        const placeholder = config.placeholder || 'Type your message...';
-        const showBranding = config.showBranding !== false;
-
-        const bubble = document.createElement('div');
-        bubble.className = 'supportbot-widget-bubble';
-        bubble.style.background = primaryColor;
-        bubble.style[position] = '24px';
-        bubble.textContent = '💬';
-        bubble.onclick = () => toggle(true);
-
-        const windowEl = document.createElement('div');
-        windowEl.className = 'supportbot-chat-window';
-        windowEl.style[position] = '24px';
-        windowEl.style.display = state.open ? 'flex' : 'none';
-
-        windowEl.innerHTML = `
-          <div style="background:${{config.primaryColor || '#3B82F6'}};color:${{config.backgroundColor || '#FFFFFF'}};padding:16px;">
-            <div style="display:flex;justify-content:space-between;align-items:center;">
-              <strong>Support</strong>
-              <button aria-label="Close chat" style="background:none;border:none;color:${{config.backgroundColor || '#FFFFFF'}};font-size:20px;cursor:pointer;">×</button>
-            </div>
-            <p style="margin-top:8px;font-size:13px;opacity:0.8;">We're here to help</p>
-          </div>
-          <div class="supportbot-messages" style="flex:1;padding:16px;overflow-y:auto;background:${{config.backgroundColor || '#FFFFFF'}};"></div>
-          <div class="supportbot-input" style="padding:16px;border-top:1px solid #e2e8f0;background:${{config.backgroundColor || '#FFFFFF'}};">
-            <form style="display:flex;gap:8px;">
-              <input type="text" placeholder="${{config.placeholder || 'Type your message...'}}" style="flex:1;padding:10px 12px;border:1px solid #cbd5f5;border-radius:8px;" />
-              <button type="submit" style="background:${{config.primaryColor || '#3B82F6'}};color:${{config.backgroundColor || '#FFFFFF'}};border:none;border-radius:8px;padding:0 14px;cursor:pointer;">Send</button>
-            </form>
-          </div>
-        `;
-        if (showBranding) {{
-          const inputSection = windowEl.querySelector('.supportbot-input');
-          if (inputSection) {{
-            inputSection.insertAdjacentHTML(
-              'beforeend',
-              '<p style="margin-top:8px;text-align:center;font-size:11px;color:#94a3b8;">Powered by SupportBot</p>'
-            );
-          }}
-        }}
-
-        const closeButton = windowEl.querySelector('button');
-        if (closeButton) {{
-          closeButton.addEventListener('click', () => toggle(false));
-        }}
-
-        const form = windowEl.querySelector('form');
-        const input = windowEl.querySelector('input');
-        const messagesContainer = windowEl.querySelector('.supportbot-messages');
-
-        if (state.messages.length === 0) {{
-          state.messages.push({{ id: 'welcome', role: 'assistant', content: welcomeMessage }});
-        }}
-
-        if (messagesContainer) {{
-          messagesContainer.innerHTML = '';
-          state.messages.forEach((msg) => {{
-            const bubble = document.createElement('div');
-            bubble.style.marginBottom = '12px';
-            bubble.style.display = 'flex';
-            bubble.style.justifyContent = msg.role === 'assistant' ? 'flex-start' : 'flex-end';
-
-            const bubbleInner = document.createElement('div');
-            bubbleInner.style.maxWidth = '80%';
-            bubbleInner.style.padding = '12px';
-            bubbleInner.style.borderRadius = '14px';
-            bubbleInner.style.background = msg.role === 'assistant' ? primaryColor + '15' : primaryColor;
-            bubbleInner.style.color = msg.role === 'assistant' ? '#0f172a' : backgroundColor;
-            bubbleInner.style.fontSize = '14px';
-            bubbleInner.textContent = msg.content;
-
-            if (msg.role === 'assistant' && msg.turnId) {{
-              const feedbackRow = document.createElement('div');
-              feedbackRow.style.marginTop = '8px';
-              feedbackRow.style.display = 'flex';
-              feedbackRow.style.gap = '8px';
-
-              const makeButton = (label, sentiment, activeColor) => {{
-                const button = document.createElement('button');
-                button.type = 'button';
-                button.style.display = 'inline-flex';
-                button.style.alignItems = 'center';
-                button.style.gap = '4px';
-                button.style.fontSize = '12px';
-                button.style.border = 'none';
-                button.style.background = 'transparent';
-                button.style.cursor = 'pointer';
-                button.style.color = state.feedbackByTurn[msg.turnId] === sentiment ? activeColor : '#64748b';
-                button.textContent = label;
-                button.onclick = () => submitFeedback(msg.turnId, sentiment);
-                return button;
-              }};
-
-              feedbackRow.appendChild(makeButton('👍 Helpful', 'positive', primaryColor));
-              feedbackRow.appendChild(makeButton('👎 Not helpful', 'negative', '#ef4444'));
-              bubbleInner.appendChild(feedbackRow);
-            }}
-
-            bubble.appendChild(bubbleInner);
-            messagesContainer.appendChild(bubble);
-          }});
-
-          if (state.loading) {{
-            const thinking = document.createElement('div');
-            thinking.style.fontSize = '12px';
-            thinking.style.color = '#64748b';
-            thinking.textContent = 'Thinking…';
-            messagesContainer.appendChild(thinking);
-          }}
-
-          messagesContainer.scrollTop = messagesContainer.scrollHeight;
-        }}
-
-        if (form && input) {{
-          form.onsubmit = async (event) => {{
-            event.preventDefault();
-            const userMessage = input.value.trim();
-            if (!userMessage || state.loading) {{
-              return;
-            }}
-
-            state.messages.push({{ id: 'user-' + Date.now(), role: 'user', content: userMessage }});
-            input.value = '';
-            state.loading = true;
-            rerender();
-
-            try {{
-              const tokenResponse = await fetch(API_BASE + '/widget/token', {{
-                method: 'POST',
-                headers: {{ 'Content-Type': 'application/json' }},
-                body: JSON.stringify({{ site_id: SITE_ID }}),
-              }});
-
-              if (!tokenResponse.ok) {{
-                throw new Error('Token request failed');
-              }}
-
-              const {{ token }} = await tokenResponse.json();
-
-              const chatResponse = await fetch(API_BASE + '/widget/chat', {{
-                method: 'POST',
-                headers: {{
-                  'Content-Type': 'application/json',
-                  'Authorization': 'Bearer ' + token,
-                }},
-                body: JSON.stringify({{
-                  query: userMessage,
-                  history: state.messages,
-                  top_k: config.topK || 5,
-                  temperature: config.temperature || 0.2,
-                  conversation_id: state.conversationId,
-                }}),
-              }});
-
-              if (!chatResponse.ok) {{
-                throw new Error('Chat request failed');
-              }}
-
-              const data = await chatResponse.json();
-
-              if (data.conversation_id) {{
-                state.conversationId = data.conversation_id;
-              }}
-
-              const turnId = data.turn_id || 'assistant-' + Date.now();
-              state.messages.push({{
-                id: turnId,
-                role: 'assistant',
-                content: data.answer || "I'm sorry, I could not come up with an answer.",
-                turnId,
-              }});
-            }} catch (error) {{
-              console.error('Widget error:', error);
-              state.messages.push({{
-                id: 'error-' + Date.now(),
-                role: 'assistant',
-                content: 'Something went wrong while fetching the answer. Please try again later.',
-              }});
-            }} finally {{
-              state.loading = false;
-              rerender();
-            }}
-          }};
-        }}
-
-        container.innerHTML = '';
-        container.appendChild(bubble);
-        container.appendChild(windowEl);
-      }}
-
-      function rerender() {{
-        render();
-      }}
-
-      function toggle(open) {{
-        state.open = open;
-        rerender();
-      }}
-
-      async function submitFeedback(turnId, sentiment) {{
-        state.feedbackByTurn[turnId] = sentiment;
-        rerender();
-
-        try {{
-          const tokenResponse = await fetch(API_BASE + '/widget/token', {{
-            method: 'POST',
-            headers: {{ 'Content-Type': 'application/json' }},
-            body: JSON.stringify({{ site_id: SITE_ID }}),
-          }});
-
-          if (!tokenResponse.ok) {{
-            throw new Error('Feedback token request failed');
-          }}
-
-          const {{ token }} = await tokenResponse.json();
-
-          await fetch(API_BASE + '/analytics/feedback', {{
-            method: 'POST',
-            headers: {{
-              'Content-Type': 'application/json',
-              'Authorization': 'Bearer ' + token,
-            }},
-            body: JSON.stringify({{
-              site_id: SITE_ID,
-              conversation_id: state.conversationId,
-              turn_id: turnId,
-              sentiment,
-              metadata: {{ source: 'widget' }},
-            }}),
-          }});
-        }} catch (error) {{
-          console.error('Feedback submission failed:', error);
-        }}
-      }}
-
-      render();
-    }})(); """
-
-    return Response(content=script, media_type="application/javascript")
+async def widget_script(
+    if_none_match: str | None = Header(None), accept_encoding: str | None = Header(None)
+):
+    if accept_encoding and "gzip" in accept_encoding:
+        content, headers = WIDGET_JS_GZIP, WIDGET_JS_GZIP_HEADERS
+    else:
+        content, headers = WIDGET_JS_BYTES, WIDGET_JS_HEADERS
+
+    if if_none_match and (if_none_match.strip() == "*" or headers["ETag"] in if_none_match):
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type="application/javascript", headers=headers)
 
 
 @app.get("/debug-file/{file_path:path}")
@@ -1271,29 +2039,29 @@ async def debug_file(file_path: str):
     try:
         logger.info(f"🔍 Debugging file: {file_path}")
 
-        # List all files first
-        all_files = supabase.storage.from_("Docs").list("")
-        logger.info(f"Available files: {[f['name'] for f in all_files]}")
-
-        # Try to download
+        # Probe the file through a short-lived signed URL: a HEAD request proves it can be
+        # downloaded and reports its size without pulling the body into memory
         try:
-            response = supabase.storage.from_("Docs").download(file_path)
-            if response:
-                logger.info(f"✅ Successfully downloaded: {file_path}")
-                return {
-                    "status": "success",
-                    "message": f"File {file_path} downloaded successfully",
-                    "size": len(response),
-                }
-            else:
-                logger.error(f"❌ Download returned None for: {file_path}")
-                return {"status": "error", "message": "Download returned None"}
+            signed = await docs_bucket.create_signed_url(file_path, 60)
+            signed_url = signed.get("signedURL") or signed.get("signedUrl")
+            response = await http_client.head(signed_url)
+            response.raise_for_status()
+            content_length = response.headers.get("Content-Length")
+            logger.info(f"✅ File is downloadable: {file_path}")
+            return {
+                "status": "success",
+                "message": f"File {file_path} is available for download",
+                "size": int(content_length) if content_length is not None else None,
+            }
         except Exception as e:
             logger.error(f"❌ Download failed: {e}")
+            # Only list likely matches: same folder, names containing the requested basename
+            folder, _, name = file_path.rpartition("/")
+            candidates = await docs_bucket.list(folder, {"limit": 100, "search": name})
             return {
                 "status": "error",
                 "message": str(e),
-                "available_files": [f["name"] for f in all_files],
+                "available_files": [f["name"] for f in candidates],
             }
 
     except Exception as e:
@@ -1308,6 +2076,8 @@ async def storage_webhook(request: dict):
     try:
         logger.info(f"Webhook received: {request}")
         event_type = request.get("type")
+        # Any storage change makes the cached bucket listing stale
+        _invalidate_documents_listing()
 
         if event_type == "INSERT":
             # New file uploaded
@@ -1316,10 +2086,20 @@ async def storage_webhook(request: dict):
             file_name = record.get("name", "").split("/")[-1]
 
             if file_path and file_name:
+                upload_key = (file_path, record.get("id"))
+                if _is_redelivery(upload_key):
+                    logger.info(f"⏭️ Ignoring redelivered upload event: {file_path}")
+                    return {"status": "success"}
                 logger.info(f"🚀 New file uploaded: {file_name}")
                 logger.info(f"📁 File path: {file_path}")
-                # Process document in background
-                asyncio.create_task(pipeline.process_document_by_path(file_path))
+                # Process document in background; a full queue pushes back on the sender
+                try:
+                    _ingest_queue.put_nowait(file_path)
+                except asyncio.QueueFull:
+                    # Not queued, so the sender's retry must not be treated as a redelivery
+                    _recent_uploads.pop(upload_key, None)
+                    logger.warning(f"Ingestion queue full, rejecting webhook for {file_path}")
+                    raise HTTPException(status_code=503, detail="Ingestion queue is full")
             else:
                 logger.warning(f"Invalid webhook data: {request}")
         else:
@@ -1327,6 +2107,8 @@ async def storage_webhook(request: dict):
 
         return {"status": "success"}
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Webhook error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,13 @@
+"""PDF page-range text extraction, run inside worker processes
+
+Kept free of imports with side effects (clients, config) so pool workers start quickly
+and never touch the app's connections.
+"""
+
+
+def extract_page_range(file_content: bytes, start: int, stop: int) -> str:
+    """Extract the text of pages ``start``..``stop - 1`` with PyMuPDF"""
+    import pymupdf
+
+    with pymupdf.open(stream=file_content, filetype="pdf") as pdf:
+        return "\n".join(pdf[index].get_text("text") for index in range(start, stop))
@@ -1,23 +1,28 @@
+import os
+import sys
+from pathlib import Path
+
 from qdrant_client import QdrantClient
 from qdrant_client.models import Filter
 
-try:
-    # Try relative/package imports first
-    try:
-        from .config import Config
-    except Exception:
-        try:
-            from RAG.config import Config
-        except Exception:
-            # fallback: import by module name after adding current dir to sys.path
-            from pathlib import Path
-            import sys as _sys
-            curr = Path(__file__).resolve().parent
-            if str(curr) not in _sys.path:
-                _sys.path.insert(0, str(curr))
-            from config import Config
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+# Qdrant-only maintenance script: skip the server's import-time check for the Supabase,
+# OpenAI and CORS settings it never uses
+os.environ.setdefault("KUBOID_VALIDATE_ON_IMPORT", "0")
 
-    client = QdrantClient(url=Config.QDRANT_URL, api_key=getattr(Config, "QDRANT_API_KEY", None))
+# Same module name as docs.py/core.supabase so config is only ever loaded once
+from RAG.config import Config
+
+try:
+    client = QdrantClient(
+        url=Config.QDRANT_URL,
+        api_key=Config.QDRANT_API_KEY,
+        prefer_grpc=Config.QDRANT_PREFER_GRPC,
+        grpc_port=Config.QDRANT_GRPC_PORT,
+    )
 except Exception:
     # Fallback to local default
     client = QdrantClient(host="localhost", port=6333)
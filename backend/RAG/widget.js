@@ -0,0 +1,305 @@
+(function() {
+  const config = window.supportBotConfig || {};
+  const SITE_ID = config.siteId || 'default';
+  const API_BASE = config.apiBase || '__WIDGET_SCRIPT_BASE_URL__';
+  const WIDGET_ID = 'supportbot-widget-container';
+
+  if (document.getElementById(WIDGET_ID)) {
+    return;
+  }
+
+  const styles = document.createElement('style');
+  styles.textContent = `
+    .supportbot-widget-bubble {
+      position: fixed;
+      bottom: 24px;
+      z-index: 9998;
+      width: 56px;
+      height: 56px;
+      border-radius: 50%;
+      display: flex;
+      align-items: center;
+      justify-content: center;
+      box-shadow: 0 10px 40px rgba(15,23,42,0.18);
+      cursor: pointer;
+      transition: transform 0.2s ease;
+    }
+
+    .supportbot-widget-bubble:hover {
+      transform: translateY(-3px);
+    }
+
+    .supportbot-chat-window {
+      position: fixed;
+      bottom: 90px;
+      width: 360px;
+      height: 520px;
+      border-radius: 16px;
+      box-shadow: 0 20px 60px rgba(15,23,42,0.25);
+      overflow: hidden;
+      display: flex;
+      flex-direction: column;
+      background: #ffffff;
+      z-index: 9999;
+    }
+  `;
+  document.head.appendChild(styles);
+
+  const container = document.createElement('div');
+  container.id = WIDGET_ID;
+  document.body.appendChild(container);
+
+  const state = {
+    open: false,
+    messages: [],
+    loading: false,
+    conversationId: null,
+    feedbackByTurn: {},
+    token: null,
+    tokenExpiresAt: 0,
+  };
+
+  // One widget token serves every chat and feedback call until shortly before it expires
+  async function getToken() {
+    if (state.token && Date.now() < state.tokenExpiresAt - 5000) {
+      return state.token;
+    }
+
+    const tokenResponse = await fetch(API_BASE + '/widget/token', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ site_id: SITE_ID }),
+    });
+
+    if (!tokenResponse.ok) {
+      throw new Error('Token request failed');
+    }
+
+    const { token, expires_in } = await tokenResponse.json();
+    state.token = token;
+    state.tokenExpiresAt = Date.now() + (expires_in || 3600) * 1000;
+    return token;
+  }
+
+  function render() {
+    const primaryColor = config.primaryColor || '#3B82F6';
+    const backgroundColor = config.backgroundColor || '#FFFFFF';
+    const position = config.position === 'bottom-left' ? 'left' : 'right';
+    const welcomeMessage = config.welcomeMessage || 'Hi there! How can I help you?';
+    const placeholder = config.placeholder || 'Type your message...';
+    const showBranding = config.showBranding !== false;
+
+    const bubble = document.createElement('div');
+    bubble.className = 'supportbot-widget-bubble';
+    bubble.style.background = primaryColor;
+    bubble.style[position] = '24px';
+    bubble.textContent = '💬';
+    bubble.onclick = () => toggle(true);
+
+    const windowEl = document.createElement('div');
+    windowEl.className = 'supportbot-chat-window';
+    windowEl.style[position] = '24px';
+    windowEl.style.display = state.open ? 'flex' : 'none';
+
+    windowEl.innerHTML = `
+      <div style="background:${config.primaryColor || '#3B82F6'};color:${config.backgroundColor || '#FFFFFF'};padding:16px;">
+        <div style="display:flex;justify-content:space-between;align-items:center;">
+          <strong>Support</strong>
+          <button aria-label="Close chat" style="background:none;border:none;color:${config.backgroundColor || '#FFFFFF'};font-size:20px;cursor:pointer;">×</button>
+        </div>
+        <p style="margin-top:8px;font-size:13px;opacity:0.8;">We're here to help</p>
+      </div>
+      <div class="supportbot-messages" style="flex:1;padding:16px;overflow-y:auto;background:${config.backgroundColor || '#FFFFFF'};"></div>
+      <div class="supportbot-input" style="padding:16px;border-top:1px solid #e2e8f0;background:${config.backgroundColor || '#FFFFFF'};">
+        <form style="display:flex;gap:8px;">
+          <input type="text" placeholder="${config.placeholder || 'Type your message...'}" style="flex:1;padding:10px 12px;border:1px solid #cbd5f5;border-radius:8px;" />
+          <button type="submit" style="background:${config.primaryColor || '#3B82F6'};color:${config.backgroundColor || '#FFFFFF'};border:none;border-radius:8px;padding:0 14px;cursor:pointer;">Send</button>
+        </form>
+      </div>
+    `;
+    if (showBranding) {
+      const inputSection = windowEl.querySelector('.supportbot-input');
+      if (inputSection) {
+        inputSection.insertAdjacentHTML(
+          'beforeend',
+          '<p style="margin-top:8px;text-align:center;font-size:11px;color:#94a3b8;">Powered by SupportBot</p>'
+        );
+      }
+    }
+
+    const closeButton = windowEl.querySelector('button');
+    if (closeButton) {
+      closeButton.addEventListener('click', () => toggle(false));
+    }
+
+    const form = windowEl.querySelector('form');
+    const input = windowEl.querySelector('input');
+    const messagesContainer = windowEl.querySelector('.supportbot-messages');
+
+    if (state.messages.length === 0) {
+      state.messages.push({ id: 'welcome', role: 'assistant', content: welcomeMessage });
+    }
+
+    if (messagesContainer) {
+      messagesContainer.innerHTML = '';
+      state.messages.forEach((msg) => {
+        const bubble = document.createElement('div');
+        bubble.style.marginBottom = '12px';
+        bubble.style.display = 'flex';
+        bubble.style.justifyContent = msg.role === 'assistant' ? 'flex-start' : 'flex-end';
+
+        const bubbleInner = document.createElement('div');
+        bubbleInner.style.maxWidth = '80%';
+        bubbleInner.style.padding = '12px';
+        bubbleInner.style.borderRadius = '14px';
+        bubbleInner.style.background = msg.role === 'assistant' ? primaryColor + '15' : primaryColor;
+        bubbleInner.style.color = msg.role === 'assistant' ? '#0f172a' : backgroundColor;
+        bubbleInner.style.fontSize = '14px';
+        bubbleInner.textContent = msg.content;
+
+        if (msg.role === 'assistant' && msg.turnId) {
+          const feedbackRow = document.createElement('div');
+          feedbackRow.style.marginTop = '8px';
+          feedbackRow.style.display = 'flex';
+          feedbackRow.style.gap = '8px';
+
+          const makeButton = (label, sentiment, activeColor) => {
+            const button = document.createElement('button');
+            button.type = 'button';
+            button.style.display = 'inline-flex';
+            button.style.alignItems = 'center';
+            button.style.gap = '4px';
+            button.style.fontSize = '12px';
+            button.style.border = 'none';
+            button.style.background = 'transparent';
+            button.style.cursor = 'pointer';
+            button.style.color = state.feedbackByTurn[msg.turnId] === sentiment ? activeColor : '#64748b';
+            button.textContent = label;
+            button.onclick = () => submitFeedback(msg.turnId, sentiment);
+            return button;
+          };
+
+          feedbackRow.appendChild(makeButton('👍 Helpful', 'positive', primaryColor));
+          feedbackRow.appendChild(makeButton('👎 Not helpful', 'negative', '#ef4444'));
+          bubbleInner.appendChild(feedbackRow);
+        }
+
+        bubble.appendChild(bubbleInner);
+        messagesContainer.appendChild(bubble);
+      });
+
+      if (state.loading) {
+        const thinking = document.createElement('div');
+        thinking.style.fontSize = '12px';
+        thinking.style.color = '#64748b';
+        thinking.textContent = 'Thinking…';
+        messagesContainer.appendChild(thinking);
+      }
+
+      messagesContainer.scrollTop = messagesContainer.scrollHeight;
+    }
+
+    if (form && input) {
+      form.onsubmit = async (event) => {
+        event.preventDefault();
+        const userMessage = input.value.trim();
+        if (!userMessage || state.loading) {
+          return;
+        }
+
+        state.messages.push({ id: 'user-' + Date.now(), role: 'user', content: userMessage });
+        input.value = '';
+        state.loading = true;
+        rerender();
+
+        try {
+          const token = await getToken();
+
+          const chatResponse = await fetch(API_BASE + '/widget/chat', {
+            method: 'POST',
+            headers: {
+              'Content-Type': 'application/json',
+              'Authorization': 'Bearer ' + token,
+            },
+            body: JSON.stringify({
+              query: userMessage,
+              history: state.messages,
+              top_k: config.topK || 5,
+              temperature: config.temperature || 0.2,
+              conversation_id: state.conversationId,
+            }),
+          });
+
+          if (!chatResponse.ok) {
+            throw new Error('Chat request failed');
+          }
+
+          const data = await chatResponse.json();
+
+          if (data.conversation_id) {
+            state.conversationId = data.conversation_id;
+          }
+
+          const turnId = data.turn_id || 'assistant-' + Date.now();
+          state.messages.push({
+            id: turnId,
+            role: 'assistant',
+            content: data.answer || "I'm sorry, I could not come up with an answer.",
+            turnId,
+          });
+        } catch (error) {
+          console.error('Widget error:', error);
+          state.messages.push({
+            id: 'error-' + Date.now(),
+            role: 'assistant',
+            content: 'Something went wrong while fetching the answer. Please try again later.',
+          });
+        } finally {
+          state.loading = false;
+          rerender();
+        }
+      };
+    }
+
+    container.innerHTML = '';
+    container.appendChild(bubble);
+    container.appendChild(windowEl);
+  }
+
+  function rerender() {
+    render();
+  }
+
+  function toggle(open) {
+    state.open = open;
+    rerender();
+  }
+
+  async function submitFeedback(turnId, sentiment) {
+    state.feedbackByTurn[turnId] = sentiment;
+    rerender();
+
+    try {
+      const token = await getToken();
+
+      await fetch(API_BASE + '/analytics/feedback', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': 'Bearer ' + token,
+        },
+        body: JSON.stringify({
+          site_id: SITE_ID,
+          conversation_id: state.conversationId,
+          turn_id: turnId,
+          sentiment,
+          metadata: { source: 'widget' },
+        }),
+      });
+    } catch (error) {
+      console.error('Feedback submission failed:', error);
+    }
+  }
+
+  render();
+})();
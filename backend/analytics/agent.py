@@ -8,6 +8,7 @@ from collections import defaultdict
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 import logging
+import os
 from pathlib import Path
 import sys
 from typing import Any, DefaultDict, Dict, Iterable, List, Optional, Tuple
@@ -18,6 +19,11 @@ if str(BACKEND_ROOT) not in sys.path:
 
 from supabase import Client
 
+if __name__ == "__main__":
+    # Run as a CLI: CORS_ORIGINS is a server-only setting, so skip the import-time
+    # validation; Supabase settings are still checked when the client is created
+    os.environ.setdefault("KUBOID_VALIDATE_ON_IMPORT", "0")
+
 from RAG.config import Config
 from core.supabase import get_supabase_client
 
@@ -1,15 +1,60 @@
 from typing import Optional
 
-from supabase import Client, create_client
+import httpx
+from supabase import AsyncClient, AsyncClientOptions, Client, ClientOptions
+from supabase import acreate_client, create_client
 
 from RAG.config import Config
 
 _supabase: Optional[Client] = None
+_async_supabase: Optional[AsyncClient] = None
+_async_http_client: Optional[httpx.AsyncClient] = None
+
+# Keep-alive pool sizing shared by the sync and async clients
+SUPABASE_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+SUPABASE_HTTP_TIMEOUT = httpx.Timeout(120, connect=10)
 
 
 def get_supabase_client() -> Client:
     global _supabase
     if _supabase is None:
-        _supabase = create_client(Config.SUPABASE_URL, Config.SUPABASE_SERVICE_ROLE_KEY)
+        # One keep-alive HTTP/2 pool shared by the PostgREST, storage and auth clients,
+        # so table and bucket calls reuse TLS connections instead of opening their own
+        http_client = httpx.Client(
+            http2=True,
+            timeout=SUPABASE_HTTP_TIMEOUT,
+            follow_redirects=True,
+            limits=SUPABASE_HTTP_LIMITS,
+        )
+        _supabase = create_client(
+            Config.SUPABASE_URL,
+            Config.SUPABASE_SERVICE_ROLE_KEY,
+            options=ClientOptions(httpx_client=http_client),
+        )
     return _supabase
 
+
+async def get_async_supabase_client() -> AsyncClient:
+    """Native asyncio client for code running on the event loop (no thread hops)"""
+    global _async_supabase, _async_http_client
+    if _async_supabase is None:
+        _async_http_client = httpx.AsyncClient(
+            http2=True,
+            timeout=SUPABASE_HTTP_TIMEOUT,
+            follow_redirects=True,
+            limits=SUPABASE_HTTP_LIMITS,
+        )
+        _async_supabase = await acreate_client(
+            Config.SUPABASE_URL,
+            Config.SUPABASE_SERVICE_ROLE_KEY,
+            options=AsyncClientOptions(httpx_client=_async_http_client),
+        )
+    return _async_supabase
+
+
+async def close_async_supabase_client() -> None:
+    global _async_supabase, _async_http_client
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+    _async_supabase = None
+    _async_http_client = None
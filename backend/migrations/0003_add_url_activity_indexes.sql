@@ -0,0 +1,18 @@
+-- 0003_add_url_activity_indexes.sql
+-- Indexes for /url-activities, which filters url_ingestion_activity by owner
+-- (user_id, site_id or the same keys inside metadata) and returns the newest rows first.
+-- Run this in your Supabase SQL editor or with psql against your database.
+
+-- Owner + recency, so each branch of the OR is answered from an index instead of a seq scan
+CREATE INDEX IF NOT EXISTS idx_url_activity_user_started_at
+  ON public.url_ingestion_activity (user_id, started_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_url_activity_site_started_at
+  ON public.url_ingestion_activity (site_id, started_at DESC);
+
+-- Expression indexes for the metadata->>'user_id' / metadata->>'site_id' branches
+CREATE INDEX IF NOT EXISTS idx_url_activity_metadata_user_id
+  ON public.url_ingestion_activity ((metadata->>'user_id'));
+
+CREATE INDEX IF NOT EXISTS idx_url_activity_metadata_site_id
+  ON public.url_ingestion_activity ((metadata->>'site_id'));